@@ -19,7 +19,10 @@ import queue
 import signal
 from concurrent.futures import ProcessPoolExecutor
 import threading
+import time
 
+from toga import requests
+from toga import wire_format
 from toga.genetic_algorithm.genetic_algorithm import GeneticAlgorithm
 from toga.toga_settings import Settings
 from toga.worker import Worker
@@ -34,8 +37,74 @@ def run_worker(individual) -> Worker:
     return worker.run()
 
 
+class SubmissionBuffer(object):
+    """
+    Holds high performers so they can be sent to the server in one request. The buffer is due once max_size
+    individuals are waiting or the oldest has waited max_age seconds.
+
+    >>> buffer = SubmissionBuffer(max_size=2, max_age=60)
+    >>> buffer.add({'uuid': 'a'}), buffer.due()
+    (False, False)
+    >>> buffer.add({'uuid': 'b'}), buffer.due()
+    (True, True)
+    >>> oldest, items = buffer.oldest, buffer.drain()
+    >>> items, buffer.due()
+    ([{'uuid': 'a'}, {'uuid': 'b'}], False)
+    >>> buffer.add({'uuid': 'c'})
+    False
+    >>> buffer.restore(items, oldest)
+    >>> buffer.items, buffer.oldest == oldest
+    ([{'uuid': 'a'}, {'uuid': 'b'}, {'uuid': 'c'}], True)
+    """
+
+    def __init__(self, max_size=1, max_age=0):
+        self.max_size = max(1, max_size)
+        self.max_age = max_age
+        self.items = []
+        self.oldest = None
+
+    def add(self, item):
+        if not self.items:
+            self.oldest = time.monotonic()
+        self.items.append(item)
+        return self.full()
+
+    def full(self):
+        return len(self.items) >= self.max_size
+
+    def time_until_due(self):
+        if not self.items:
+            return self.max_age if self.max_age > 0 else 1.0
+        return max(0.0, self.oldest + self.max_age - time.monotonic())
+
+    def due(self):
+        return len(self.items) > 0 and (self.full() or self.time_until_due() <= 0)
+
+    def drain(self):
+        items = self.items
+        self.items = []
+        self.oldest = None
+        return items
+
+    def restore(self, items, oldest):
+        """
+        Put drained items back in front of the buffer, after sending them failed
+
+        :param items: items returned by drain
+        :param oldest: the oldest time the buffer had before drain
+        """
+        if not items:
+            return
+        self.items = items + self.items
+        self.oldest = oldest if self.oldest is None else min(oldest, self.oldest)
+
+
 class TogaClient(object):
 
+    # seconds the dispatcher waits after runs failed, doubled every time it wakes up to more failures up to the maximum
+    FAILURE_BACKOFF = 0.2
+    MAX_FAILURE_BACKOFF = 60
+
     def __init__(self, loop=None):
         """
         :param loop:
@@ -44,10 +113,20 @@ class TogaClient(object):
         self.settings = Settings()
         self.settings.create_output_directory()
         self.url = f'http://{self.settings.host}:{self.settings.port}'
+
+        # Encoding used for the archive and submissions, the server falls back to JSON if it can't read it
+        self.wire_format = wire_format.select_format(self.settings.wire_format)
+        self.headers = {'Accept': self.wire_format, 'Content-Type': self.wire_format}
         self.genetic_algorithm = GeneticAlgorithm()
 
         # Handle asyncio event loop stuff
-        self.executor = ProcessPoolExecutor(max_workers=self.settings.process_pool_size)
+        self.executor = None
+        if self.settings.executor == 'process_pool':
+            self.executor = ProcessPoolExecutor(max_workers=self.settings.process_pool_size)
+        elif self.settings.executor != 'subprocess':
+            raise Exception(f'Unknown executor {self.settings.executor}, expected process_pool or subprocess')
+        # runs started by the subprocess executor, at most process_pool_size of them at a time
+        self.worker_slots = asyncio.Semaphore(self.settings.process_pool_size)
         self.tasks = []
         self.loop = loop
         self.loop.add_signal_handler(signal.SIGINT, self.stop)
@@ -58,14 +137,38 @@ class TogaClient(object):
         # up in queue
         self.population = queue.Queue(maxsize=self.settings.overfill_executor_limit)
 
+        # Individuals handed to the executor and not yet scored. The dispatcher keeps process_pool_size +
+        # overfill_executor_limit of them in flight and is woken by run_complete whenever one finishes
+        self.in_flight = set()
+        self.run_complete = asyncio.Event()
+        # runs that failed in a row, the dispatcher backs off while they keep failing
+        self.failed_runs = 0
+
         # Track number of trials run since last high performer
         self.trials = 0
         self.trialLock = threading.Lock()
 
+        # High performers waiting to be sent to the server together
+        self.submissions = SubmissionBuffer(max_size=self.settings.submit_batch_size,
+                                            max_age=self.settings.submit_batch_age)
+
+        # Last archive version received from the server, only changes after it are requested
+        self.server_archive = None
+        self.server_version = 0
+
+        # Connection pool shared by every request to the server, created once the event loop is running
+        self.session = None
+
+        # True while the server pushes archive changes over /ws, polling /get_state is skipped meanwhile
+        self.subscribed = False
+
     def run(self):
         logging.info('Starting tasks, Genetic Algorithm Loop and server heartbeat synchronization')
         self.tasks.append(self.loop.create_task(self.request_server_state()))
-        self.tasks.append(self.loop.create_task(self.heartbeat()))
+        if self.settings.use_websocket:
+            self.tasks.append(self.loop.create_task(self.subscribe()))
+        self.tasks.append(self.loop.create_task(self.dispatch()))
+        self.tasks.append(self.loop.create_task(self.flush_stale_submissions()))
 
         try:
             self.loop.run_forever()
@@ -74,44 +177,176 @@ class TogaClient(object):
             self.stop()
 
     def stop(self):
-        for task in self.tasks:
+        for task in self.tasks + list(self.in_flight):
             logging.info('Cleaning up open tasks...')
             task.cancel()
+        # send whatever high performers are still waiting, then close the connections to the server
+        self.loop.create_task(self.shutdown())
         logging.info('done.')
 
+    async def shutdown(self):
+        try:
+            await self.flush_submissions()
+        finally:
+            await self.close_session()
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = requests.create_session(limit_per_host=self.settings.connection_limit_per_host,
+                                                   keepalive_timeout=self.settings.keepalive_timeout,
+                                                   dns_cache_ttl=self.settings.dns_cache_ttl,
+                                                   timeout=self.settings.request_timeout)
+        return self.session
+
+    async def close_session(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
     async def submit_results(self, high_performer: dict) -> aiohttp.ClientResponse:
-        async with aiohttp.ClientSession() as session:
-            async with session.put(self.url + "/submit", data=json.dumps(high_performer)) as resp:
-                return await resp.json(content_type=None)
+        return await requests.submit_results(self.url, high_performer, session=self.get_session())
+
+    async def submit_batch(self, individuals: list) -> aiohttp.ClientResponse:
+        data = wire_format.encode({'individuals': individuals}, self.wire_format)
+        async with self.get_session().put(self.url + "/submit_batch", data=data, headers=self.headers,
+                                          compress=self.settings.compress_requests or None) as resp:
+            if resp.status >= 500:
+                resp.raise_for_status()
+            return wire_format.decode(await resp.read(), resp.content_type)
+
+    async def flush_submissions(self):
+        """
+        Send every buffered high performer. If the request fails they go back in the buffer, with the trials counted
+        on them, and are sent with the next flush.
+
+        :return: False if the request failed
+        """
+        oldest = self.submissions.oldest
+        individuals = self.submissions.drain()
+        if not individuals:
+            return True
+        try:
+            res = await self.submit_batch(individuals)
+        except Exception:
+            self.submissions.restore(individuals, oldest)
+            logging.exception(f'Submitting {len(individuals)} individuals to {self.url} failed, keeping them')
+            return False
+        logging.info(f'Server stored {len(res.get("stored", []))} of {len(individuals)} submitted individuals')
+        return True
+
+    async def flush_stale_submissions(self):
+        while True:
+            await asyncio.sleep(self.submissions.time_until_due())
+            if self.submissions.due() and not await self.flush_submissions():
+                # the server is unreachable, don't retry in a tight loop once the buffer is overdue
+                await asyncio.sleep(max(self.submissions.max_age, 1.0))
 
     async def synchronize_state(self):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.url + "/get_state", data=None) as resp:
-                return await resp.json(content_type=None)
+        params = {'since': self.server_version}
+        if self.server_archive is not None:
+            params['archive'] = self.server_archive
+        async with self.get_session().get(self.url + "/get_state", params=params, headers=self.headers) as resp:
+            return wire_format.decode(await resp.read(), resp.content_type)
+
+    def apply_server_changes(self, changes):
+        self.genetic_algorithm.pareto_frontier.apply_changes(changes)
+        self.server_archive = changes.get('archive')
+        self.server_version = changes.get('version')
 
     async def request_server_state(self):
         while True:
-            res = await self.synchronize_state()
-            global_state = json.loads(res)
-            self.genetic_algorithm.pareto_frontier.update_from_local_datadict(global_state)
-            logging.info(f'Requesting state update from server at {self.url}')
-            print('running')
-            await asyncio.sleep(360)
-
-    async def heartbeat(self):
+            if not self.subscribed:
+                logging.info(f'Requesting state update from server at {self.url}')
+                try:
+                    self.apply_server_changes(await self.synchronize_state())
+                except Exception as e:
+                    logging.warning(f'State update from {self.url} failed: {e}')
+            await asyncio.sleep(self.settings.sync_interval)
+
+    async def subscribe(self):
+        """
+        Receive archive changes pushed by the server on /ws. While the connection is down request_server_state polls
+        instead and the connection is retried every sync_interval seconds.
+
+        :return:
+        """
+        while True:
+            try:
+                async with self.get_session().ws_connect(self.url + "/ws", headers={'Accept': self.wire_format},
+                                                         heartbeat=30) as ws:
+                    await ws.send_str(json.dumps({'since': self.server_version, 'archive': self.server_archive}))
+                    self.subscribed = True
+                    logging.info(f'Subscribed to archive changes from {self.url}')
+                    async for message in ws:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            changes = wire_format.decode(message.data.encode('utf-8'), wire_format.JSON)
+                        elif message.type == aiohttp.WSMsgType.BINARY:
+                            changes = wire_format.decode(message.data, self.wire_format)
+                        else:
+                            break
+                        self.apply_server_changes(changes)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f'Archive change subscription failed, polling instead: {e}')
+            finally:
+                self.subscribed = False
+            await asyncio.sleep(self.settings.sync_interval)
+
+    async def dispatch(self):
+        """
+        Fill every free executor slot as soon as it frees up. Runs are started until process_pool_size +
+        overfill_executor_limit are in flight, then the dispatcher sleeps until one of them completes. The population
+        queue is topped up afterwards so the next free slot gets an individual without waiting for one to be bred.
+
+        :return:
+        """
+        in_flight_limit = self.settings.process_pool_size + self.settings.overfill_executor_limit
+        delay = 0
         while True:
-            if not self.population.full():
-                self.population.put(self.genetic_algorithm.create_individual())
-            if not self.population.empty():
-                overfill_limit = self.settings.process_pool_size + self.settings.overfill_executor_limit
-                if len(list(self.executor._pending_work_items.keys())) < overfill_limit:
-                    self.tasks.append(self.loop.create_task(self.run_sample()))
-            await asyncio.sleep(0.2)
-
-    async def run_sample(self):
-        if not self.population.empty():
-            individual = self.population.get()
-            result = await self.loop.run_in_executor(self.executor, run_worker, individual)
+            if self.failed_runs:
+                # runs that fail as soon as they start would otherwise be restarted in a hot loop
+                delay = min(delay * 2, self.MAX_FAILURE_BACKOFF) if delay else self.FAILURE_BACKOFF
+                logging.warning(f'{self.failed_runs} runs failed in a row, waiting {delay:.1f} seconds')
+                await asyncio.sleep(delay)
+            else:
+                delay = 0
+            self.run_complete.clear()
+            while len(self.in_flight) < in_flight_limit:
+                if self.population.empty():
+                    individual = self.genetic_algorithm.create_individual()
+                else:
+                    individual = self.population.get_nowait()
+                task = self.loop.create_task(self.run_sample(individual))
+                self.in_flight.add(task)
+                task.add_done_callback(self.sample_done)
+
+            while not self.population.full():
+                self.population.put_nowait(self.genetic_algorithm.create_individual())
+            await self.run_complete.wait()
+
+    def sample_done(self, task):
+        self.in_flight.discard(task)
+        self.run_complete.set()
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.failed_runs += 1
+            logging.error(f'Run failed: {task.exception()}')
+        else:
+            self.failed_runs = 0
+
+    async def run_individual(self, individual):
+        if self.executor is not None:
+            return await self.loop.run_in_executor(self.executor, run_worker, individual)
+
+        async with self.worker_slots:
+            return await Worker(individual).run_async()
+
+    async def run_sample(self, individual):
+        result = None
+        try:
+            result = await self.run_individual(individual)
             try:
                 high_performer = self.genetic_algorithm.score_results(result)
                 logging.info(f'Completed {result.__repr__}')
@@ -123,14 +358,16 @@ class TogaClient(object):
                     high_performer[0]['trials'] = self.trials
                     self.trials = 0
                     self.trialLock.release()
-                    res = await self.submit_results(high_performer[0])
-                    print(json.loads(res))
+                    self.submissions.add(high_performer[0])
+                    if self.submissions.due():
+                        await self.flush_submissions()
                 else:
                     logging.info(f'Not Adding individual to performance metrics')
-            except Exception as e:
-                print(e)
-                # print(result.individual.convert_to_dict())
-                pass
+            except Exception:
+                logging.exception(f'Scoring or submitting {result.__repr__} failed')
+        finally:
+            # score_results removes the workdir and config of a run, a run that failed or was cancelled never gets there
+            (result if result is not None else Worker(individual)).cleanup()
 
 
 if __name__ == '__main__':
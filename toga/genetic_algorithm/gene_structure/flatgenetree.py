@@ -0,0 +1,118 @@
+"""
+Date  : 10/18/26
+
+Brief : Flat replacement of GeneTree, the parameters of the gene template are a list addressed by index
+
+Notes : FlatGeneTemplate walks the template once and stores the key path, gene type and range config of every parameter
+        in the depth first order GeneTree mutates them in, with a plan to build the gene dictionary back from a list of
+        values in a single pass. A FlatGeneTree only holds the values its parents have for every parameter, looked up
+        by key path, so creating and serializing an individual is linear in the size of the template. With the same
+        Generator it draws the same values as GeneTree.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+from toga.genetic_algorithm.gene_structure.genelayout import MISSING, lookup
+from toga.genetic_algorithm.genetype import GeneType
+from toga.genetic_algorithm.mutate.handle_type import mutate
+
+# kinds of the entries of a FlatGeneTemplate plan
+PARAM, DICT, STATIC = 0, 1, 2
+
+
+class FlatGeneTemplate(object):
+    """
+
+    >>> template = FlatGeneTemplate({'a': {'param_type': 'float', 'range': [0, 1]},
+    ...                              'b': {'c': {'param_type': 'int', 'range': [1, 5]}, 'd': 'static'}})
+    >>> template.paths
+    [('a',), ('b', 'c')]
+    >>> template.build([0.5, 3])
+    {'a': 0.5, 'b': {'c': 3, 'd': 'static'}}
+    """
+
+    def __init__(self, config: dict):
+        if not config:
+            raise Exception("No range config was found to define how to work with gene files for TOGA")
+
+        self.paths = []  # key path of every parameter
+        self.gene_types = []  # GeneType of every parameter
+        self.range_configs = []  # the keys of its GeneType from the template, for every parameter
+        self.plan = self._compile(config, ())  # nested list of (key, kind, parameter index, sub plan or static value)
+
+    def _compile(self, config, path):
+        plan = []
+        for key, item in config.items():
+            key_path = path + (key,)
+            if isinstance(item, dict) and 'param_type' in item:
+                gene_type = GeneType(item.get('param_type'))
+                plan.append((key, PARAM, len(self.paths)))
+                self.paths.append(key_path)
+                self.gene_types.append(gene_type)
+                self.range_configs.append({_: item[_] for _ in gene_type.keys})
+            elif isinstance(item, dict) and item:
+                plan.append((key, DICT, self._compile(item, key_path)))
+            else:
+                # an empty dictionary is a node without children or value in GeneTree
+                plan.append((key, STATIC, None if isinstance(item, dict) else item))
+        return plan
+
+    def __len__(self):
+        return len(self.paths)
+
+    def build(self, values):
+        """
+        Gene dictionary of the values of every parameter, in template order
+
+        :param values: list of values indexed like paths
+        :return: dict
+        """
+        return self._build(self.plan, values)
+
+    def _build(self, plan, values):
+        gene = {}
+        for key, kind, item in plan:
+            if kind == PARAM:
+                gene[key] = values[item]
+            elif kind == DICT:
+                gene[key] = self._build(item, values)
+            else:
+                gene[key] = item
+        return gene
+
+
+class FlatGeneTree(object):
+    """
+
+    >>> import numpy
+    >>> template = FlatGeneTemplate({'a': {'param_type': 'int', 'range': [0, 10]}, 'b': 'static'})
+    >>> FlatGeneTree(template, parents=[{'a': 4, 'b': 'static'}], mutator_params={'type_probability':
+    ...              {'int': {'crossover': 1}}}, rng=numpy.random.default_rng(0)).mutate()
+    {'a': 4, 'b': 'static'}
+    """
+
+    def __init__(self, template: FlatGeneTemplate, parents: [], mutator_params: dict, rng=None):
+        self.template = template
+        self.parents = parents
+        self.mutator_params = mutator_params  # {'type_probability': mutator weights of every gene type}
+        self.rng = rng  # numpy.random.Generator of every draw
+
+        # the values the parents have for every parameter, parents without the parameter are skipped
+        self.values = [[] for _ in range(len(template))]
+        for parent in parents or []:
+            for values, path in zip(self.values, template.paths):
+                value = lookup(parent, path)
+                if value is not MISSING:
+                    values.append(value)
+
+    def mutate(self):
+        type_probability = self.mutator_params.get('type_probability')
+        template = self.template
+        out = [mutate(gene_type, range_config, None, values, None, type_probability, self.rng)
+               for gene_type, range_config, values in zip(template.gene_types, template.range_configs, self.values)]
+        return template.build(out)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
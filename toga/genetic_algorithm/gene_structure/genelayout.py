@@ -0,0 +1,217 @@
+"""
+Date  : 10/18/26
+
+Brief : Column layout of a gene template, so a batch of genes can be stored as a few NumPy arrays
+
+Notes : Every float, int, bool and enum parameter of the template is a column of a 2d array with one row per gene,
+        enums are stored as the index into their values. Every binary block is a (genes, bytes) uint8 matrix of its
+        components packed 8 to a byte, see mutate.bitblock.
+        Static values of the template aren't stored, decode puts them back in. Parameters a gene doesn't have are
+        read as the minimum of their range.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import numpy
+
+from toga.genetic_algorithm.genetype import GeneType
+from toga.genetic_algorithm.mutate import bitblock
+
+# lookup of a key path the gene doesn't have
+MISSING = object()
+
+
+class GeneBatch(object):
+    """
+    Genes stored by column, see GeneLayout
+    """
+
+    def __init__(self, floats, ints, bools, enums, blocks):
+        self.floats = floats  # (genes, float params) float64
+        self.ints = ints  # (genes, int params) int64
+        self.bools = bools  # (genes, bool params) int8 of 0 and 1
+        self.enums = enums  # (genes, enum params) int64 index into the values of each enum
+        self.blocks = blocks  # list of (genes, bytes) uint8 of the packed components, one per binary block
+
+    def __len__(self):
+        return len(self.floats)
+
+    def take(self, indices):
+        """
+
+        :param indices: rows to keep
+        :return: GeneBatch of those rows
+        """
+        return GeneBatch(self.floats[indices], self.ints[indices], self.bools[indices], self.enums[indices],
+                         [block[indices] for block in self.blocks])
+
+
+class GeneLayout(object):
+    """
+
+    >>> config = {'a': {'param_type': 'float', 'range': [0, 1]},
+    ...           'b': {'c': {'param_type': 'int', 'range': [1, 5]}, 'd': 'static'},
+    ...           'e': {'param_type': 'enum', 'values': ['x', 'y']},
+    ...           'f': {'param_type': 'binary_block', 'components': {'p': 0, 'q': 0}, 'sum_range': [0, 2]}}
+    >>> layout = GeneLayout(config)
+    >>> batch = layout.encode([{'a': 0.5, 'b': {'c': 3, 'd': 'static'}, 'e': 'y', 'f': {'p': 1, 'q': 0}}])
+    >>> batch.floats.tolist(), batch.ints.tolist(), batch.enums.tolist(), batch.blocks[0].tolist()
+    ([[0.5]], [[3]], [[1]], [[128]])
+    >>> layout.decode(batch)
+    [{'a': 0.5, 'b': {'c': 3, 'd': 'static'}, 'e': 'y', 'f': {'p': 1, 'q': 0}}]
+    """
+
+    def __init__(self, config: dict):
+        if not config:
+            raise Exception("No range config was found to define how to work with gene files for TOGA")
+
+        self.float_paths, self.float_lower, self.float_upper = [], [], []
+        self.int_paths, self.int_lower, self.int_upper = [], [], []
+        self.bool_paths = []
+        self.enum_paths, self.enum_values = [], []
+        self.block_paths, self.block_components, self.block_lower, self.block_upper, self.block_minimum = \
+            [], [], [], [], []
+
+        # nested list of (key, kind, column) in template order that decode builds the gene dictionaries from
+        self.plan = self._compile(config, ())
+
+        self.float_lower = numpy.array(self.float_lower, dtype=float)
+        self.float_upper = numpy.array(self.float_upper, dtype=float)
+        self.int_lower = numpy.array(self.int_lower, dtype=numpy.int64)
+        self.int_upper = numpy.array(self.int_upper, dtype=numpy.int64)
+        self.enum_sizes = numpy.array([len(values) for values in self.enum_values], dtype=numpy.int64)
+        self.enum_index = [{_value_key(value): index for index, value in enumerate(values)}
+                           for values in self.enum_values]
+
+    def _compile(self, config, path):
+        plan = []
+        for key, item in config.items():
+            key_path = path + (key,)
+            if not isinstance(item, dict) or not item:
+                plan.append((key, 'static', item if item != {} else None))
+            elif 'param_type' not in item:
+                plan.append((key, 'dict', self._compile(item, key_path)))
+            else:
+                gene_type = GeneType(item.get('param_type'))
+                if gene_type == GeneType.FloatType:
+                    plan.append((key, 'float', len(self.float_paths)))
+                    self.float_paths.append(key_path)
+                    self.float_lower.append(min(item['range']))
+                    self.float_upper.append(max(item['range']))
+                elif gene_type == GeneType.IntType:
+                    plan.append((key, 'int', len(self.int_paths)))
+                    self.int_paths.append(key_path)
+                    self.int_lower.append(min(item['range']))
+                    self.int_upper.append(max(item['range']))
+                elif gene_type == GeneType.BoolType:
+                    plan.append((key, 'bool', len(self.bool_paths)))
+                    self.bool_paths.append(key_path)
+                elif gene_type == GeneType.EnumType:
+                    plan.append((key, 'enum', len(self.enum_paths)))
+                    self.enum_paths.append(key_path)
+                    self.enum_values.append(list(item['values']))
+                else:
+                    components = item['components']
+                    plan.append((key, 'binary_block', len(self.block_paths)))
+                    self.block_paths.append(key_path)
+                    self.block_components.append(list(components.keys()))
+                    self.block_lower.append(min(item['sum_range']))
+                    self.block_upper.append(max(item['sum_range']))
+                    self.block_minimum.append(bitblock.pack([value == 1 for value in components.values()]))
+        return plan
+
+    def empty(self, amount):
+        """
+
+        :param amount: rows
+        :return: GeneBatch of every parameter at the minimum of its range
+        """
+        return GeneBatch(floats=numpy.tile(self.float_lower, (amount, 1)),
+                         ints=numpy.tile(self.int_lower, (amount, 1)),
+                         bools=numpy.zeros((amount, len(self.bool_paths)), dtype=numpy.int8),
+                         enums=numpy.zeros((amount, len(self.enum_paths)), dtype=numpy.int64),
+                         blocks=[numpy.tile(minimum, (amount, 1)) for minimum in self.block_minimum])
+
+    def encode(self, genes):
+        """
+
+        :param genes: list of gene dictionaries
+        :return: GeneBatch
+        """
+        batch = self.empty(len(genes))
+        for row, gene in enumerate(genes):
+            for column, path in enumerate(self.float_paths):
+                value = lookup(gene, path)
+                if value is not MISSING:
+                    batch.floats[row, column] = value
+            for column, path in enumerate(self.int_paths):
+                value = lookup(gene, path)
+                if value is not MISSING:
+                    batch.ints[row, column] = value
+            for column, path in enumerate(self.bool_paths):
+                value = lookup(gene, path)
+                if value is not MISSING:
+                    batch.bools[row, column] = 1 if value else 0
+            for column, path in enumerate(self.enum_paths):
+                value = lookup(gene, path)
+                if value is not MISSING:
+                    batch.enums[row, column] = self.enum_index[column].get(_value_key(value), 0)
+            for block, path in enumerate(self.block_paths):
+                value = lookup(gene, path)
+                if isinstance(value, dict):
+                    batch.blocks[block][row] = bitblock.pack([value.get(component) == 1
+                                                              for component in self.block_components[block]])
+        return batch
+
+    def decode(self, batch):
+        """
+
+        :param batch: GeneBatch
+        :return: list of gene dictionaries, keys in the order of the template
+        """
+        columns = {'float': batch.floats.tolist(),
+                   'int': batch.ints.tolist(),
+                   'bool': batch.bools.tolist(),
+                   'enum': batch.enums.tolist()}
+        blocks = [bitblock.unpack(block, len(components)).astype(numpy.int8).tolist()
+                  for block, components in zip(batch.blocks, self.block_components)]
+        return [self._build(self.plan, row, columns, blocks) for row in range(len(batch))]
+
+    def _build(self, plan, row, columns, blocks):
+        gene = {}
+        for key, kind, column in plan:
+            if kind == 'static':
+                gene[key] = column
+            elif kind == 'dict':
+                gene[key] = self._build(column, row, columns, blocks)
+            elif kind == 'enum':
+                gene[key] = self.enum_values[column][columns['enum'][row][column]]
+            elif kind == 'binary_block':
+                gene[key] = dict(zip(self.block_components[column], blocks[column][row]))
+            else:
+                gene[key] = columns[kind][row][column]
+        return gene
+
+
+def lookup(gene, path):
+    """
+
+    :param gene: gene dictionary
+    :param path: key path into it
+    :return: the value at path, MISSING if there is none
+    """
+    for key in path:
+        if not isinstance(gene, dict) or key not in gene:
+            return MISSING
+        gene = gene[key]
+    return gene
+
+
+def _value_key(value):
+    # enum values can be lists, which can't be dictionary keys
+    return repr(value)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
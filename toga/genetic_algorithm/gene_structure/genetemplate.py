@@ -0,0 +1,98 @@
+"""
+Date  : 10/18/26
+
+Brief : Parse the gene template once and keep what individuals are created from: its FlatGeneTemplate and its
+        GeneLayout
+
+Notes : The template is read again only when the modification time or size of the file changes. The config and
+        everything compiled from it are shared by every individual created from them and must not be modified.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import os
+import threading
+
+import yaml
+
+from toga.genetic_algorithm.gene_structure.flatgenetree import FlatGeneTemplate
+from toga.genetic_algorithm.gene_structure.genelayout import GeneLayout
+
+
+class GeneTemplate(object):
+    """
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'gene.yml')
+    >>> with open(path, 'w') as f:
+    ...     _ = f.write("x:\\n  param_type: 'int'\\n  range: [0, 10]\\n")
+    >>> template = GeneTemplate.load(path)
+    >>> template.config
+    {'x': {'param_type': 'int', 'range': [0, 10]}}
+    >>> GeneTemplate.load(path) is template
+    True
+    >>> with open(path, 'w') as f:
+    ...     _ = f.write("y:\\n  param_type: 'float'\\n  range: [0, 1]\\n")
+    >>> os.utime(path, ns=(0, 0))
+    >>> GeneTemplate.load(path).flat.paths
+    [('y',)]
+    """
+
+    _cache = {}
+    _lock = threading.Lock()
+
+    def __init__(self, path, stamp, config):
+        self.path = path
+        self.stamp = stamp  # (modification time, size) of the file this was parsed from
+        self.config = config
+        self.flat = FlatGeneTemplate(config)
+        self._layout = None
+
+    @property
+    def layout(self):
+        """
+        GeneLayout of the config for batch mutation, compiled on first use
+        """
+        if self._layout is None:
+            self._layout = GeneLayout(self.config)
+        return self._layout
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def load(cls, path):
+        """
+        Template parsed from path, parsed again if the file changed since the last call
+
+        :param path: gene template yml
+        :return: GeneTemplate
+        """
+        path = os.path.abspath(path)
+        stamp = cls._stamp(path)
+        with cls._lock:
+            template = cls._cache.get(path)
+            if template is not None and template.stamp == stamp:
+                return template
+
+            try:
+                with open(path, 'r') as f:
+                    config = yaml.safe_load(f)
+            except yaml.YAMLError as exc:
+                print(exc)
+                raise
+            template = cls(path, stamp, config)
+            cls._cache[path] = template
+            return template
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._cache.clear()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
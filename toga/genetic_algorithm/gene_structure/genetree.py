@@ -22,9 +22,10 @@ class GeneTree(object):
 
     """
 
-    def __init__(self, config: dict, parents: [], mutator: str, mutator_params: dict):
+    def __init__(self, config: dict, parents: [], mutator: str, mutator_params: dict, rng=None):
         # Attributes needed to define a gene tree that can create specific values
         self.config = config  # the ranges allowed defined in the range file
+        self.rng = rng  # numpy.random.Generator of every draw made for this tree
         self.parents = parents  # the selected instances that will be used to create a new instance with
         self.mutator = {'mutator': mutator,  # the mutator that will be applied to the tree to output a new value
                         'mutator_params': mutator_params}  # extra values a particular mutator might require
@@ -37,10 +38,10 @@ class GeneTree(object):
             raise Exception("No range config was found to define how to work with gene files for TOGA")
 
         if not root:
-            root = Node(None, children=None, **{'key': 'root'})
+            root = Node(None, children=None, **{'key': 'root', 'rng': self.rng})
 
         # Walk with side effects, will use the range config dictionary to update the values of root
-        self.update(self.config, node=root, mutator=self.mutator)
+        self.update(self.config, node=root, mutator=self.mutator, rng=self.rng)
 
         root.update_leaf_count()
 
@@ -99,7 +100,8 @@ class GeneTree(object):
         self.tree.mutate_subtree()
         return self.tree.to_dictionary.get('root')
 
-    def update(self, _dict: dict, node: 'Node', mutator=None):
+    @staticmethod
+    def update(_dict: dict, node: 'Node', mutator=None, rng=None):
         for key, item in _dict.items():
             if isinstance(item, dict):
                 param_type = item.get('param_type')
@@ -117,18 +119,21 @@ class GeneTree(object):
                                                                 'gene_type': gene_type,
                                                                 'range_config': range_config_dict,
                                                                 'mutator': mutator.get('mutator'),
-                                                                'mutator_params': mutator.get('mutator_params')
+                                                                'mutator_params': mutator.get('mutator_params'),
+                                                                'rng': rng
                                                                 })
                     node.add_child(child)
                 else:
                     child = Node(parent=node, children=None, **{'key': key,
                                                                 'mutator': mutator.get('mutator'),
-                                                                'mutator_params': mutator.get('mutator_params')})
+                                                                'mutator_params': mutator.get('mutator_params'),
+                                                                'rng': rng})
                     node.add_child(child)
-                    self.update(item, child, mutator)
+                    GeneTree.update(item, child, mutator, rng)
             else:
                 child = Node(parent=Node, children=None, **{'key': key,
                                                             'mutator_params': mutator.get('mutator_params'),
-                                                            'static_value': True})
+                                                            'static_value': True,
+                                                            'rng': rng})
                 child.value = item
                 node.add_child(child)
@@ -43,17 +43,19 @@ class Metrics(object):
 
 class Lineage(object):
 
-    def __init__(self, mutator='', parent1=None, parent2=None, generation_num=0):
+    def __init__(self, mutator='', parent1=None, parent2=None, generation_num=0, seed=None):
         self.mutator = mutator
         self.parent1 = None if parent1 is None else parent1.get('uuid')
         self.parent2 = None if parent2 is None else parent2.get('uuid')
         self.generation_num = generation_num
+        self.seed = seed  # entropy and spawn_key of the SeedSequence this individual was mutated with
 
     def compose(self):
         return {"mutator": self.mutator,
                 "parent1": self.parent1,
                 "parent2": self.parent2,
-                "generation_num": self.generation_num
+                "generation_num": self.generation_num,
+                "seed": self.seed
                 }
 
 
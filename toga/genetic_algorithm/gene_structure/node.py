@@ -11,12 +11,11 @@ Notes :
 Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
 U.S. Government Sponsorship acknowledged.
 """
-import random
-
 import numpy as np
 import uuid
 
 from toga.genetic_algorithm.genetype import GeneType
+from toga.genetic_algorithm.mutate.genemutate import DEFAULT_RANDOM
 from toga.genetic_algorithm.mutate.handle_type import mutate
 from toga.utils import first
 
@@ -34,6 +33,9 @@ class Node(object):
         # Hierarchy properties
         self.parent = parent
         self.children = [] if not children else children
+        self._children_by_name = {}  # first child of every name, for get_child
+        for child in self.children:
+            self._children_by_name.setdefault(child.name, child)
 
         # Node Properties
         self._is_leaf = self.is_leaf  # Does ths node have children
@@ -54,6 +56,7 @@ class Node(object):
         # Stored values at this node
         self.mutator = kwargs.get('mutator')  # What mutator is being used
         self.mutator_params = kwargs.get('mutator_params')
+        self.rng = kwargs.get('rng')  # numpy.random.Generator of the individual this tree creates
         self.values = []  # From each individual that is selected collect its value at this key and append here
 
         # The value this node will have after mutation
@@ -91,40 +94,50 @@ class Node(object):
         leaves = self.leaves
         leaves = [i for i in leaves if i.static_value is False and len(i.values) > 0]
 
+        rng = self.rng if self.rng is not None else DEFAULT_RANDOM
         mutable_allowed_num = 0
         if self.mutator == 'partial':
-            mutable_allowed_num = random.randint(1, len(leaves))
+            mutable_allowed_num = int(rng.integers(1, len(leaves) + 1))
         if self.mutator == 'min':
             mutable_allowed_num = len(leaves) - 1
 
         if leaves:
             # this is to disable mutation, opposite of what mutator would imply
-            leaf_nodes = np.random.choice(leaves, size=mutable_allowed_num, replace=False)
+            leaf_nodes = rng.choice(leaves, size=mutable_allowed_num, replace=False)
             for leaf in leaf_nodes:
                 node = self.get_nested_child(leaf.uuid)
                 node.allow_mutations = False
 
     def add_child(self, child: 'Node') -> None:
         self.children.append(child)
+        self._children_by_name.setdefault(child.name, child)
         self.is_leaf  # Side effect, will update is leaf anytime this is called
 
     def remove_child(self, child: 'Node'):
-        self.children.remove(child.uuid)
+        self.children.remove(child)
+        if self._children_by_name.get(child.name) is child:
+            del self._children_by_name[child.name]
+            replacement = first(x for x in self.children if x.name == child.name)
+            if replacement is not None:
+                self._children_by_name[child.name] = replacement
         self.is_leaf  # Side effect, will update is leaf anytime this is called
 
     def get_child(self, key: str):
-        return first(x for x in self.children if x.name == key)
+        return self._children_by_name.get(key)
 
     def get_nested_child(self, uuid=''):
         """
         Only match against uuid to guarantee a match, incase of same name. Have a getter give self to get uuid for this
         :param uuid:
-        :return:
+        :return: the node below this one with uuid, None if there isn't one
         """
         for child in self.children:
             if child.uuid == uuid:
                 return child
-            child.get_nested_child()
+            nested = child.get_nested_child(uuid)
+            if nested is not None:
+                return nested
+        return None
 
     def remove(self):
         if not self.parent:
@@ -147,13 +160,19 @@ class Node(object):
             child.mutate()  # run mutate
             child.mutate_subtree()  # run on children
 
-    def get_leaf_nodes(self):
-        leaves = []
+    def get_leaf_nodes(self, leaves=None):
+        """
+
+        :param leaves: list the leaves are appended to
+        :return: every leaf below this node, in depth first order
+        """
+        leaves = [] if leaves is None else leaves
 
         for child in self.children:
             if child.is_leaf:
                 leaves.append(child)
-            child.get_leaf_nodes()
+            else:
+                child.get_leaf_nodes(leaves)
         return leaves
 
     def update_leaf_count(self):
@@ -249,10 +268,11 @@ class Node(object):
                 self._to_dictionary = {self.key: self.value}
             return
 
+        # update in place, merging into a new dictionary for every child is quadratic in the number of children
         _dict = {}
         for child in self.children:
             child.update_dictionary()
-            _dict = {**_dict, **child._to_dictionary}
+            _dict.update(child._to_dictionary)
         self._to_dictionary = {self.key: _dict}
 
     def mutate(self):
@@ -262,7 +282,8 @@ class Node(object):
                          self.value,
                          self.values,
                          None,
-                         self.mutator_params.get('type_probability'))
+                         self.mutator_params.get('type_probability'),
+                         self.rng)
             self.value = out
         else:
             if self.values:
@@ -22,7 +22,9 @@ class GeneticAlgorithm(object):
                                               maximize=self.settings.optimization_strategy,
                                               fitness_metrics=Metrics(self.settings.optimization_metrics).metrics,
                                               amount_per_bin=self.settings.individual_per_bin,
-                                              history_log=None)
+                                              history_log=None,
+                                              archive=self.settings.archive,
+                                              archive_options=self.settings.archive_options)
 
         self.population = Population(pareto_frontier=self.pareto_frontier)
 
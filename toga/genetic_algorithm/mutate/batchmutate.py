@@ -0,0 +1,237 @@
+"""
+Date  : 10/18/26
+
+Brief : Mutate and cross over a whole batch of genes at once with NumPy, column by column instead of node by node
+
+Notes : Works on the GeneBatch columns of a GeneLayout. Every parameter of every child rolls its own mutator with the
+        weights of its type, as GeneTree does, and every mutator is computed for the whole column with one NumPy call.
+        The mutators follow the IntGene, FloatGene, BooleanGene, EnumGene and BinaryBlockGene ones. Crossover picks a
+        parent per parameter, and per component for binary blocks. Types without mutator weights are drawn at random.
+        Binary blocks stay packed, see bitblock, and are brought back into their sum_range by bitblock.repair.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import math
+
+import numpy
+import scipy.stats as stats
+
+from toga.genetic_algorithm.gene_structure.genelayout import GeneBatch
+from toga.genetic_algorithm.genetype import Mutator
+from toga.genetic_algorithm.mutate import bitblock
+from toga.genetic_algorithm.mutate.genemutate import DEFAULT_RANDOM
+from toga.genetic_algorithm.mutate.handle_type import MutatorTable
+
+
+class BatchMutate(object):
+    """
+
+    >>> from toga.genetic_algorithm.gene_structure.genelayout import GeneLayout
+    >>> config = {'a': {'param_type': 'float', 'range': [0, 1]},
+    ...           'b': {'param_type': 'int', 'range': [1, 5]},
+    ...           'c': {'param_type': 'binary_block', 'components': {'p': 0, 'q': 0, 'r': 0}, 'sum_range': [1, 2]}}
+    >>> layout = GeneLayout(config)
+    >>> engine = BatchMutate(layout, {'float': {'random': 1}, 'int': {'crossover': 1},
+    ...                               'binary_block': {'crossover': 1}})
+    >>> children = engine.generate(1000)
+    >>> bool(((children.floats >= 0) & (children.floats <= 1)).all())
+    True
+    >>> bool(((children.ints >= 1) & (children.ints < 5)).all())
+    True
+    >>> sorted(set(bitblock.popcount(children.blocks[0]).tolist()))
+    [1, 2]
+    >>> parents = layout.encode([{'a': 0.0, 'b': 2, 'c': {'p': 1, 'q': 0, 'r': 0}},
+    ...                          {'a': 1.0, 'b': 4, 'c': {'p': 1, 'q': 0, 'r': 0}}])
+    >>> children = engine.generate(1000, parents=parents)
+    >>> sorted(set(children.ints[:, 0].tolist()))
+    [2, 4]
+    >>> bitblock.unpack(children.blocks[0], 3).sum(axis=0).tolist()
+    [1000, 0, 0]
+    """
+
+    def __init__(self, layout, type_probability=None, percentage=1.0):
+        self.layout = layout
+        self.percentage = percentage  # how far along the range the scaled mutator goes, as in GeneMutate subclasses
+        type_probability = type_probability if type_probability is not None else {}
+        self.mutators = {gene_type: _mutator_table(type_probability.get(gene_type))
+                         for gene_type in ('float', 'int', 'bool', 'enum', 'binary_block')}
+
+    def _roll(self, gene_type, shape, rng):
+        """
+        Draw a mutator per entry
+
+        :return: list of mutator names and an array of indices into it
+        """
+        names, cumulative = self.mutators[gene_type]
+        if len(names) == 1:
+            return names, numpy.zeros(shape, dtype=numpy.int64)
+        return names, numpy.searchsorted(cumulative, rng.random(shape) * cumulative[-1], side='right')
+
+    def generate(self, amount, parents=None, pairs=None, rng=None):
+        """
+        Mutate a batch of children
+
+        :param amount: how many children
+        :param parents: GeneBatch of the parents to draw from, None to create every child at random
+        :param pairs: (amount, parents per child) array of rows of parents, drawn uniformly if None
+        :param rng: numpy.random.Generator of every draw
+        :return: GeneBatch of the children
+        """
+        rng = rng if rng is not None else DEFAULT_RANDOM
+        if parents is not None and len(parents) == 0:
+            parents = None
+        if parents is not None:
+            if pairs is None:
+                pairs = rng.integers(0, len(parents), size=(amount, 2))
+            pairs = numpy.asarray(pairs, dtype=numpy.int64).reshape(amount, -1)
+
+        def stacked(column):
+            # (parents per child, amount, parameters) values of each child's parents
+            if parents is None:
+                return None
+            return column[pairs.T]
+
+        layout = self.layout
+        return GeneBatch(
+            floats=self._floats(amount, stacked(parents.floats) if parents is not None else None, rng),
+            ints=self._ints(amount, stacked(parents.ints) if parents is not None else None, rng),
+            bools=self._bools(amount, stacked(parents.bools) if parents is not None else None, rng),
+            enums=self._enums(amount, stacked(parents.enums) if parents is not None else None, rng),
+            blocks=[self._block(amount, block, stacked(parents.blocks[block]) if parents is not None else None, rng)
+                    for block in range(len(layout.block_paths))])
+
+    def _apply(self, gene_type, shape, candidates, dtype, rng, per_row=False):
+        """
+        Pick the value of the mutator rolled for every entry
+
+        :param candidates: dict of mutator name to a function returning that mutator's values for every entry
+        :param per_row: roll one mutator for a whole row instead of one per entry
+        :return: array of shape
+        """
+        names, rolled = self._roll(gene_type, shape[:1] if per_row else shape, rng)
+        out = numpy.zeros(shape, dtype=dtype)
+        for index, name in enumerate(names):
+            selected = rolled == index
+            if selected.any():
+                values = numpy.broadcast_to(candidates.get(name, candidates[Mutator.Random.value])(), shape)
+                out[selected] = values[selected]
+        return out
+
+    @staticmethod
+    def _crossover(stacked_parents, shape, rng):
+        choice = rng.integers(0, len(stacked_parents), size=shape)
+        return numpy.take_along_axis(stacked_parents, choice[None], axis=0)[0]
+
+    def _floats(self, amount, parents, rng):
+        lower, upper = self.layout.float_lower, self.layout.float_upper
+        shape = (amount, len(lower))
+        if not shape[1]:
+            return numpy.zeros(shape, dtype=float)
+
+        def random():
+            return rng.uniform(lower, upper, size=shape)
+
+        def gaussian_random():
+            # FloatGene centers on the mean of numpy.arange over the range
+            mean = lower + (numpy.maximum(numpy.ceil(upper - lower), 1) - 1) / 2
+            return numpy.clip(rng.normal(mean, 3, size=shape), lower, upper)
+
+        candidates = {Mutator.Random.value: random,
+                      Mutator.GaussianRandom.value: gaussian_random,
+                      Mutator.Scaled.value: lambda: (upper - lower) * self.percentage + lower,
+                      Mutator.minimum.value: lambda: lower,
+                      Mutator.maximum.value: lambda: upper}
+        if parents is not None:
+            candidates[Mutator.Crossover.value] = lambda: self._crossover(parents, shape, rng)
+            candidates[Mutator.GaussianStep.value] = lambda: numpy.clip(
+                rng.normal(parents[0], numpy.abs(upper - lower) / 4), lower, upper)
+        return self._apply('float', shape, candidates, float, rng)
+
+    def _ints(self, amount, parents, rng):
+        lower, upper = self.layout.int_lower, self.layout.int_upper
+        shape = (amount, len(lower))
+        if not shape[1]:
+            return numpy.zeros(shape, dtype=numpy.int64)
+
+        def random():
+            # upper is exclusive as in IntGene
+            return rng.integers(lower, upper, size=shape)
+
+        def gaussian_random():
+            mean = (lower + upper - 1) / 2
+            # inverse CDF of uniform draws, scipy only takes a Generator as random_state from 1.4
+            values = stats.truncnorm.ppf(rng.random(shape), (lower - mean) / 3, (upper - mean) / 3, loc=mean, scale=3)
+            return numpy.trunc(values).astype(numpy.int64)
+
+        candidates = {Mutator.Random.value: random,
+                      Mutator.GaussianRandom.value: gaussian_random,
+                      Mutator.Scaled.value: lambda: numpy.trunc((upper - lower) * self.percentage + lower),
+                      Mutator.minimum.value: lambda: lower,
+                      Mutator.maximum.value: lambda: upper}
+        if parents is not None:
+            candidates[Mutator.Crossover.value] = lambda: self._crossover(parents, shape, rng)
+            candidates[Mutator.GaussianStep.value] = lambda: numpy.rint(numpy.clip(
+                rng.normal(parents[0], numpy.abs(upper - lower) / 4), lower, upper))
+        return self._apply('int', shape, candidates, numpy.int64, rng)
+
+    def _bools(self, amount, parents, rng):
+        shape = (amount, len(self.layout.bool_paths))
+        if not shape[1]:
+            return numpy.zeros(shape, dtype=numpy.int8)
+
+        candidates = {Mutator.Random.value: lambda: rng.integers(0, 2, size=shape),
+                      Mutator.Scaled.value: lambda: rng.random(shape) < self.percentage,
+                      Mutator.minimum.value: lambda: 0,
+                      Mutator.maximum.value: lambda: 1}
+        if parents is not None:
+            candidates[Mutator.Crossover.value] = lambda: self._crossover(parents, shape, rng)
+        return self._apply('bool', shape, candidates, numpy.int8, rng)
+
+    def _enums(self, amount, parents, rng):
+        sizes = self.layout.enum_sizes
+        shape = (amount, len(sizes))
+        if not shape[1]:
+            return numpy.zeros(shape, dtype=numpy.int64)
+
+        candidates = {Mutator.Random.value: lambda: (rng.random(shape) * sizes).astype(numpy.int64),
+                      Mutator.minimum.value: lambda: 0,
+                      Mutator.maximum.value: lambda: sizes - 1}
+        if parents is not None:
+            candidates[Mutator.Crossover.value] = lambda: self._crossover(parents, shape, rng)
+        return self._apply('enum', shape, candidates, numpy.int64, rng)
+
+    def _block(self, amount, block, parents, rng):
+        layout = self.layout
+        lower, upper = layout.block_lower[block], layout.block_upper[block]
+        components = len(layout.block_components[block])
+        shape = (amount, len(layout.block_minimum[block]))
+
+        candidates = {Mutator.Random.value: lambda: bitblock.random_blocks(amount, components, rng),
+                      Mutator.Scaled.value: lambda: bitblock.random_count(
+                          amount, components, int(math.ceil(lower + (upper - lower) * self.percentage)), rng),
+                      Mutator.minimum.value: lambda: layout.block_minimum[block],
+                      Mutator.maximum.value: lambda: bitblock.random_count(amount, components, upper, rng)}
+        if parents is not None:
+            candidates[Mutator.Crossover.value] = lambda: bitblock.crossover(parents, rng)
+
+        # the mutator is rolled once per block, not per component
+        packed = self._apply('binary_block', shape, candidates, numpy.uint8, rng, per_row=True)
+        return bitblock.repair(packed, components, lower, upper, parents, rng)
+
+
+def _mutator_table(weights):
+    """
+
+    :param weights: {mutator name: relative likelihood} of one gene type, or its MutatorTable
+    :return: mutator names with a likelihood above 0 and their cumulative weights
+    """
+    table = weights if isinstance(weights, MutatorTable) else MutatorTable(weights)
+    if not table.names:
+        return [Mutator.Random.value], numpy.ones(1)
+    return table.names, numpy.array(table.cumulative)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -12,32 +12,34 @@ U.S. Government Sponsorship acknowledged.
 """
 import abc
 import math
-import random
 
 import numpy as np
 from toga.genetic_algorithm.genetype import Mutator
+from toga.genetic_algorithm.mutate import bitblock
 from toga.genetic_algorithm.mutate.genemutate import GeneMutate
 
 
 class BinaryBlock(metaclass=abc.ABCMeta):
 
+    # mutator name to the method implementing it, built once per subclass
+    methods = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.methods = {member.value: getattr(cls, member.value) for member in Mutator if hasattr(cls, member.value)}
+
     def __init__(self, dictionary=None, parents=None, mutator=Mutator):
         self.dictionary = dictionary
         self.parents = parents
         self.mutator = mutator
 
-        _choices = {}
-        for name, member in Mutator.__members__.items():
-            if hasattr(self, member.value):
-                _choices[member.value] = getattr(self, member.value)
-
-        setattr(self, 'choices', _choices)
+    @property
+    def choices(self):
+        return {name: method.__get__(self) for name, method in self.methods.items()}
 
     @abc.abstractmethod
     def mutate(self):
-        if hasattr(self, 'choices'):
-            _choices = getattr(self, 'choices')
-        return _choices[self.mutator].__get__(self)()
+        return self.methods[self.mutator](self)
 
     @abc.abstractmethod
     def crossover(self):
@@ -74,18 +76,35 @@ class BinaryBlock(metaclass=abc.ABCMeta):
 
 class BinaryBlockGene(GeneMutate):
 
-    def __init__(self,  dictionary=None, parents=None, mutator=Mutator.Crossover, mutator_params={}):
+    def __init__(self,  dictionary=None, parents=None, mutator=Mutator.Crossover, mutator_params={}, rng=None):
         self.dictionary = dictionary
         self.parents = parents
         self.mutator_params = mutator_params if mutator_params is not None else {}
         self.percentage = self.mutator_params.get('percentage') if self.mutator_params.get(
             'percentage') is not None else 1.0
         self.frequency = self.mutator_params.get('frequency')
-        super().__init__(dictionary, parents, mutator)
+        super().__init__(dictionary, parents, mutator, rng)
 
     def mutate(self):
         return super().mutate()
 
+    def _keys(self):
+        return list(self.dictionary.get('components').keys())
+
+    @staticmethod
+    def _pack(blocks, keys):
+        """
+
+        :param blocks: list of component dictionaries
+        :param keys: components in order
+        :return: (len(blocks), bytes) uint8, see bitblock
+        """
+        return bitblock.pack([[block.get(key) == 1 for key in keys] for block in blocks])
+
+    @staticmethod
+    def _unpack(packed, keys):
+        return dict(zip(keys, bitblock.unpack(packed[0], len(keys)).astype(np.int8).tolist()))
+
     #Checks that the number of genes on (set to 1) in `genes` falls within range `valid range`
     #Else, flips the minimum number of genes to fit this range in the following manner:
     #   From the set of genes that could be flipped, indentify those for which a parent has the target value,
@@ -94,54 +113,36 @@ class BinaryBlockGene(GeneMutate):
     #       - only applicable when # of parents > 2, since one parent must have conributed the "bad" gene)
     #   If this subset is not sufficient in number, augment with additional random flips
     #       - should only be necessary in the case of 0 parents, else parents are invalid
+    #The genes are packed and repaired by bitblock.repair, which does this for a whole batch with NumPy
     @staticmethod
-    def _ensure_valid(genes, valid_range, parents):
-        items_on = sum(x == 1 for x in genes.values())
-        if items_on > max(valid_range) or items_on < min(valid_range):
-            if items_on > max(valid_range):
-                flip_num = items_on - max(valid_range)
-                flip_to = 0
-            else:
-                flip_num = min(valid_range) - items_on
-                flip_to = 1
-            keys = []
-            unique_keys = set()
-            for p in parents:
-                for key, item in p.items():
-                    if item == flip_to:
-                        if genes[key] != flip_to:
-                            keys.append(key)
-                            if key not in unique_keys:
-                                unique_keys.add(key)
-                    
-            flip_set = set()
-            if len(unique_keys) < flip_num:
-                remaining_num = flip_num - len(unique_keys)
-                remaining_candidates = list(filter(lambda x: genes[x] != flip_to and x not in unique_keys, genes))                        
-                flip_set = unique_keys.union(set(np.random.choice(remaining_candidates, size=remaining_num, replace=False)))
-            else:
-                while len(flip_set) < flip_num:
-                    remaining_num = flip_num - len(flip_set)
-                    flip_set = flip_set.union(set(np.random.choice(keys, size=remaining_num, replace=False)))
-                    keys = list(filter(lambda x: x not in flip_set, keys))
-            for i in flip_set:
-                genes[i] = flip_to
+    def _ensure_valid(genes, valid_range, parents, rng=None):
+        """
+
+        >>> genes = {'a': 1, 'b': 1, 'c': 1, 'd': 0}
+        >>> BinaryBlockGene._ensure_valid(genes, [0, 1], [{'a': 1, 'b': 0, 'c': 1, 'd': 0}])
+        >>> genes['b'], sum(genes.values())
+        (0, 1)
+        """
+        keys = list(genes.keys())
+        packed = BinaryBlockGene._pack([genes], keys)
+        stacked = BinaryBlockGene._pack(parents, keys)[:, None] if parents else None
+        bitblock.repair(packed, len(keys), min(valid_range), max(valid_range), stacked, rng)
+        for key, bit in BinaryBlockGene._unpack(packed, keys).items():
+            if bit != (genes[key] == 1):
+                genes[key] = bit
 
     def crossover(self):
         """
 
         :return:
         """
-        parents = [x for x in self.parents]
-
-        if parents:
-            _dict = {}
-            for key, item in parents[0].items():
-                selected_parent = np.random.randint(0, len(parents))
-                _dict[key] = parents[selected_parent][key]
+        if self.parents:
+            keys = self._keys()
+            stacked = self._pack(self.parents, keys)[:, None]
+            packed = bitblock.crossover(stacked, self.rng)
             valid_range = self.dictionary.get('sum_range')
-            BinaryBlockGene._ensure_valid(_dict, valid_range, parents)
-            return _dict
+            bitblock.repair(packed, len(keys), min(valid_range), max(valid_range), stacked, self.rng)
+            return self._unpack(packed, keys)
 
         return self.random()
 
@@ -150,14 +151,11 @@ class BinaryBlockGene(GeneMutate):
 
         :return:
         """
-        components = self.dictionary.get('components')
-        key_len = len(list(components.keys()))
-        for key in components.keys():
-            components[key] = np.random.choice(2)
+        keys = self._keys()
+        packed = bitblock.random_blocks(1, len(keys), self.rng)
         valid_range = self.dictionary.get('sum_range')
-        BinaryBlockGene._ensure_valid(components, valid_range, [])
-
-        return components
+        bitblock.repair(packed, len(keys), min(valid_range), max(valid_range), rng=self.rng)
+        return self._unpack(packed, keys)
 
     def gaussian_step(self):
         return self.random()
@@ -172,10 +170,8 @@ class BinaryBlockGene(GeneMutate):
         key_len = len(keys)
         if key_len < amount or amount < min(allowed_range) or key_len > max(allowed_range):
             raise Exception("Amount specified is larger than block size or outside allowed range")
-        ids = np.random.choice(key_len, size=amount, replace=False)
-        for i in ids:
-            components[keys[i]] = 1
-        return components
+        packed = self._pack([components], keys) | bitblock.random_count(1, key_len, amount, self.rng)
+        return self._unpack(packed, keys)
 
     def scaled(self):
         """
@@ -193,7 +189,7 @@ class BinaryBlockGene(GeneMutate):
 
         :return:
         """
-        components = self.dictionary.get('components')
+        components = dict(self.dictionary.get('components'))
         return components
 
     def maximum(self):
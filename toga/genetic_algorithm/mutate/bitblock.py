@@ -0,0 +1,165 @@
+"""
+Date  : 10/18/26
+
+Brief : Binary blocks packed 8 components to a byte, with vectorized crossover, counting and repair of batches
+
+Notes : A block of n components is a row of ceil(n / 8) uint8 in numpy.packbits order, the first component is the
+        high bit of the first byte and the padding bits after the last component are always 0. Every function works
+        on a (rows, bytes) batch, so one call handles a whole batch of offspring.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import numpy
+
+from toga.genetic_algorithm.mutate.genemutate import DEFAULT_RANDOM
+
+# number of set bits of every byte value
+POPCOUNT = numpy.array([bin(value).count('1') for value in range(256)], dtype=numpy.uint8)
+
+
+def pack(bits):
+    """
+
+    :param bits: (rows, components) of 0 and 1
+    :return: (rows, bytes) uint8
+
+    >>> pack([[1, 0, 0, 0, 0, 0, 0, 1, 1]]).tolist()
+    [[129, 128]]
+    """
+    return numpy.packbits(numpy.asarray(bits, dtype=bool), axis=-1)
+
+
+def unpack(packed, components):
+    """
+
+    :param packed: (..., bytes) uint8
+    :param components: components of the block
+    :return: (..., components) bool
+
+    >>> unpack(numpy.array([[129, 128]], dtype=numpy.uint8), 9).astype(int).tolist()
+    [[1, 0, 0, 0, 0, 0, 0, 1, 1]]
+    """
+    return numpy.unpackbits(packed, axis=-1, count=components).astype(bool)
+
+
+def popcount(packed):
+    """
+
+    :param packed: (..., bytes) uint8
+    :return: set components of every row
+
+    >>> popcount(numpy.array([[129, 128], [0, 0]], dtype=numpy.uint8)).tolist()
+    [3, 0]
+    """
+    return POPCOUNT[packed].sum(axis=-1, dtype=numpy.int64)
+
+
+def component_mask(components):
+    """
+
+    :return: bytes with the bits of the components set and the padding clear
+    """
+    return pack(numpy.ones(components, dtype=bool))
+
+
+def random_blocks(rows, components, rng=None):
+    """
+
+    :return: (rows, bytes) with every component set with probability 1/2
+    """
+    rng = rng if rng is not None else DEFAULT_RANDOM
+    mask = component_mask(components)
+    return rng.integers(0, 256, size=(rows, len(mask)), dtype=numpy.uint8) & mask
+
+
+def random_count(rows, components, count, rng=None):
+    """
+
+    :param count: set components of every row
+    :return: (rows, bytes) with count components set at random in every row
+    """
+    rng = rng if rng is not None else DEFAULT_RANDOM
+    ranks = numpy.argsort(rng.random((rows, components)), axis=1).argsort(axis=1)
+    return pack(ranks < count)
+
+
+def crossover(parents, rng=None):
+    """
+    Uniform crossover, every component of every row is taken from one of its parents at random
+
+    :param parents: (parents per row, rows, bytes) uint8
+    :return: (rows, bytes) uint8
+
+    >>> parents = numpy.array([[[0b11110000]], [[0b11001100]]], dtype=numpy.uint8)
+    >>> child = crossover(parents, numpy.random.default_rng(0))[0, 0]
+    >>> int(child & 0b11000000), int(child & 0b00000011)
+    (192, 0)
+    """
+    rng = rng if rng is not None else DEFAULT_RANDOM
+    if len(parents) == 1:
+        return parents[0].copy()
+    if len(parents) == 2:
+        # one random byte decides 8 components at once
+        mask = rng.integers(0, 256, size=parents.shape[1:], dtype=numpy.uint8)
+        return (parents[0] & mask) | (parents[1] & ~mask)
+
+    chosen = rng.integers(0, len(parents), size=parents.shape[1:-1] + (parents.shape[-1] * 8,))
+    child = numpy.zeros(parents.shape[1:], dtype=numpy.uint8)
+    for index, parent in enumerate(parents):
+        child |= parent & numpy.packbits(chosen == index, axis=-1)
+    return child
+
+
+def repair(packed, components, lower, upper, parents=None, rng=None):
+    """
+    Flip the fewest components of every row to bring its count of set components into [lower, upper], as
+    BinaryBlockGene._ensure_valid does. Components some parent has at the target value are flipped first, weighted by
+    how many parents have it, the rest are flipped at random. Only the rows out of range are unpacked.
+
+    :param packed: (rows, bytes) uint8, repaired in place
+    :param components: components of the block
+    :param lower: least set components allowed
+    :param upper: most set components allowed
+    :param parents: (parents per row, rows, bytes) uint8 or None
+    :param rng: numpy.random.Generator of the flips
+    :return: packed
+
+    >>> packed = pack([[1, 1, 1, 1], [0, 0, 0, 0], [1, 0, 1, 0]])
+    >>> popcount(repair(packed, 4, 1, 2)).tolist()
+    [2, 1, 2]
+    >>> parents = pack([[1, 0, 0, 0]] * 3)[None]
+    >>> unpack(repair(pack(numpy.zeros((3, 4))), 4, 1, 2, parents), 4).astype(int).tolist()
+    [[1, 0, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0]]
+    """
+    rng = rng if rng is not None else DEFAULT_RANDOM
+    counts = popcount(packed)
+    rows = numpy.flatnonzero((counts > upper) | (counts < lower))
+    if not len(rows):
+        return packed
+
+    bits = unpack(packed[rows], components)
+    flip_to = counts[rows] < lower
+    flip_num = numpy.where(flip_to, lower - counts[rows], counts[rows] - upper)
+    eligible = bits != flip_to[:, None]
+
+    if parents is not None:
+        votes = (unpack(parents[:, rows], components) == flip_to[None, :, None]).sum(axis=0)
+    else:
+        votes = numpy.zeros(bits.shape, dtype=numpy.int64)
+
+    # weighted sampling without replacement: sort by exponential keys scaled by the weight, preferred components first
+    keys = -numpy.log(1 - rng.random(bits.shape)) / numpy.maximum(votes, 1)
+    tiers = numpy.where(eligible, numpy.where(votes > 0, 0, 1), 2)
+    order = numpy.lexsort((keys, tiers), axis=-1)[:, :flip_num.max()]
+    chosen = numpy.arange(order.shape[1])[None, :] < flip_num[:, None]
+
+    row_index = numpy.repeat(numpy.arange(len(rows))[:, None], order.shape[1], axis=1)
+    bits[row_index[chosen], order[chosen]] = numpy.repeat(flip_to, flip_num)
+    packed[rows] = pack(bits)
+    return packed
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
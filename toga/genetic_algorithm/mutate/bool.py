@@ -17,25 +17,23 @@ from toga.genetic_algorithm.mutate.genemutate import GeneMutate
 
 class BooleanGene(GeneMutate):
 
-    def __init__(self,  dictionary=None, parents=None, mutator=Mutator.Crossover, mutator_params={}):
+    def __init__(self,  dictionary=None, parents=None, mutator=Mutator.Crossover, mutator_params={}, rng=None):
         self.dictionary = dictionary
         self.parents = parents
         self.mutator_params = mutator_params if mutator_params is not None else {}
         self.percentage = self.mutator_params.get('percentage') if self.mutator_params.get(
             'percentage') is not None else 1.0
-        super().__init__(dictionary, parents, mutator)
+        super().__init__(dictionary, parents, mutator, rng)
 
     def mutate(self):
         return super().mutate()
 
     def crossover(self):
-        value = np.random.choice([x for x in self.parents], size=1, replace=False).tolist()[0]
+        value = self.random_parent()
         return value
 
     def random(self):
-        return np.random.choice([0, 1],
-                                size=1,
-                                replace=True).tolist()[0]
+        return int(self.rng.integers(0, 2))
 
     def gaussian_step(self):
         return self.random()
@@ -44,10 +42,7 @@ class BooleanGene(GeneMutate):
         return self.random()
 
     def scaled(self):
-        return int(np.random.choice([0, 1],
-                                    size=1,
-                                    replace=True,
-                                    p=[1 - self.percentage, self.percentage]).tolist()[0])
+        return int(self.rng.random() < self.percentage)
 
     def minimum(self):
         return 0
@@ -5,26 +5,26 @@ from toga.genetic_algorithm.mutate.genemutate import GeneMutate
 
 class EnumGene(GeneMutate):
 
-    def __init__(self,  dictionary=None, parents=None, mutator=Mutator.Crossover, mutator_params={}):
+    def __init__(self,  dictionary=None, parents=None, mutator=Mutator.Crossover, mutator_params={}, rng=None):
         self.dictionary = dictionary
         self.parents = parents
         self.mutator_params = mutator_params if mutator_params is not None else {}
         self.percentage = self.mutator_params.get('percentage') if self.mutator_params.get(
             'percentage') is not None else 1.0
-        super().__init__(dictionary, parents, mutator)
+        super().__init__(dictionary, parents, mutator, rng)
 
     def mutate(self):
         return super().mutate()
 
     def crossover(self):
         if self.parents:
-            return np.random.choice([x for x in self.parents], size=1, replace=False).tolist()[0]       
+            return self.random_parent()       
         else:
             return self.random()
 
     def random(self):
         values = self.dictionary.get('values')
-        i = np.random.choice(len(values), size=1).tolist()[0]
+        i = self.rng.integers(len(values))
         return values[i]
 
     def gaussian_step(self):
@@ -11,21 +11,20 @@ Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
 U.S. Government Sponsorship acknowledged.
 """
 import numpy as np
-import random
 from toga.genetic_algorithm.genetype import Mutator
 from toga.genetic_algorithm.mutate.genemutate import GeneMutate
 
 
 class FloatGene(GeneMutate):
 
-    def __init__(self,  dictionary=None, parents=None, mutator=Mutator.Crossover, mutator_params={}):
+    def __init__(self,  dictionary=None, parents=None, mutator=Mutator.Crossover, mutator_params={}, rng=None):
         self.dictionary = dictionary
         self.parents = parents
         self.mutator_params = mutator_params if mutator_params is not None else {}
         self.percentage = self.mutator_params.get('percentage') if self.mutator_params.get(
             'percentage') is not None else 1.0
         self.frequency = self.mutator_params.get('frequency')
-        super().__init__(dictionary, parents, mutator)
+        super().__init__(dictionary, parents, mutator, rng)
 
     def mutate(self):
         """
@@ -41,7 +40,7 @@ class FloatGene(GeneMutate):
         """
 
         if self.parents:
-            value = np.random.choice([x for x in self.parents], size=1, replace=False).tolist()[0]
+            value = self.random_parent()
             return float(value)
         else:
             return self.random()
@@ -52,7 +51,7 @@ class FloatGene(GeneMutate):
         :return:
         """
         values = self.dictionary.get('range')
-        val = np.random.uniform(min(values), max(values))
+        val = self.rng.uniform(min(values), max(values))
         return float(val)
 
     def gaussian_step(self):
@@ -66,7 +65,7 @@ class FloatGene(GeneMutate):
             values = self.dictionary.get('range')
 
             scale = np.abs((max(values) - min(values)))
-            new_var = np.random.normal(loc=original, scale=scale/4)
+            new_var = self.rng.normal(loc=original, scale=scale/4)
             new_var = max(min(values), new_var)
             new_var = min(max(values), new_var)
             return float(new_var)
@@ -80,7 +79,7 @@ class FloatGene(GeneMutate):
         """
         values = self.dictionary.get('range')
         dist = np.arange(min(values), max(values))
-        return float(min(max(values), max(min(values), random.gauss(np.mean(dist), sigma=3))))
+        return float(min(max(values), max(min(values), self.rng.normal(np.mean(dist), 3))))
 
     def scaled(self):
         values = self.dictionary.get('range')
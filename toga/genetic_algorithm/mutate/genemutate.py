@@ -1,27 +1,35 @@
 import abc
 
+import numpy
+
 from toga.genetic_algorithm.genetype import Mutator
 
+# Generator of the mutators that aren't given one
+DEFAULT_RANDOM = numpy.random.default_rng()
+
 
 class GeneMutate(metaclass=abc.ABCMeta):
 
-    def __init__(self, dictionary=None, parents=None, mutator=Mutator):
+    # mutator name to the method implementing it, built once per subclass
+    methods = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.methods = {member.value: getattr(cls, member.value) for member in Mutator if hasattr(cls, member.value)}
+
+    def __init__(self, dictionary=None, parents=None, mutator=Mutator, rng=None):
         self.dictionary = dictionary
         self.parents = parents
         self.mutator = mutator
+        self.rng = rng if rng is not None else DEFAULT_RANDOM  # numpy.random.Generator of every draw
 
-        _choices = {}
-        for name, member in Mutator.__members__.items():
-            if hasattr(self, member.value):
-                _choices[member.value] = getattr(self, member.value)
-
-        setattr(self, 'choices', _choices)
+    @property
+    def choices(self):
+        return {name: method.__get__(self) for name, method in self.methods.items()}
 
     @abc.abstractmethod
     def mutate(self):
-        if hasattr(self, 'choices'):
-            _choices = getattr(self, 'choices')
-        return _choices[self.mutator].__get__(self)()
+        return self.methods[self.mutator](self)
 
     @abc.abstractmethod
     def crossover(self):
@@ -51,6 +59,9 @@ class GeneMutate(metaclass=abc.ABCMeta):
     def maximum(self):
         raise Exception("Method not implemented")
 
+    def random_parent(self):
+        return self.parents[self.rng.integers(len(self.parents))]
+
     def check_parents(self):
         if not self.parents:
             raise Exception("No parents selected")
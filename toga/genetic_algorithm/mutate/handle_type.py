@@ -1,3 +1,6 @@
+import bisect
+import itertools
+
 import numpy
 
 from toga.genetic_algorithm.genetype import Mutator, GeneType
@@ -8,60 +11,83 @@ from toga.genetic_algorithm.mutate.int import IntGene
 from toga.genetic_algorithm.mutate.enum import EnumGene
 
 
-def select_mutator(mutators):
-    if mutators:
-        selection = list(mutators.keys())
-        raw = list(mutators.values())
-        weights = [float(i) / sum(raw) for i in raw]
-        return str(numpy.random.choice(selection, 1, replace=True, p=weights)[0])
-    return ""
+class MutatorTable(object):
+    """
+    Cumulative weights of a {mutator: relative likelihood} table, compiled once so a mutator is picked with one uniform
+    draw
+
+    >>> table = MutatorTable({'random': 1, 'crossover': 3, 'scaled': 0})
+    >>> table.names, table.cumulative
+    (['random', 'crossover'], [1.0, 4.0])
+    >>> numpy.random.seed(0)
+    >>> sorted(set(table.select() for _ in range(100)))
+    ['crossover', 'random']
+    >>> MutatorTable({}).select()
+    ''
+    """
+
+    def __init__(self, weights):
+        weights = weights if weights else {}
+        self.names = [str(name) for name, weight in weights.items() if weight > 0]
+        self.cumulative = list(itertools.accumulate(float(weights[name]) for name in self.names))
+        self.total = self.cumulative[-1] if self.cumulative else 0.0
+
+    def select(self, rng=None):
+        """
+
+        :param rng: numpy.random.Generator to draw from, the global numpy.random if None
+        :return: mutator name, "" if the table is empty
+        """
+        if not self.names:
+            return ""
+        if len(self.names) == 1:
+            return self.names[0]
+        draw = rng.random() if rng is not None else numpy.random.random()
+        return self.names[bisect.bisect_right(self.cumulative, draw * self.total)]
+
+
+def compile_mutators(type_probability):
+    """
+    Compile the mutators: type: section of the genetic algorithm settings
+
+    :param type_probability: {gene type: {mutator: relative likelihood}}
+    :return: {gene type: MutatorTable}
+    """
+    return {gene_type: MutatorTable(weights) for gene_type, weights in (type_probability or {}).items()}
+
+
+def select_mutator(mutators, rng=None):
+    if isinstance(mutators, MutatorTable):
+        return mutators.select(rng)
+    return MutatorTable(mutators).select(rng)
+
+
+# mutate class of every gene type, by param_type
+GENE_MUTATORS = {GeneType.IntType.value: IntGene,
+                 GeneType.FloatType.value: FloatGene,
+                 GeneType.BoolType.value: BooleanGene,
+                 GeneType.BinaryBlockType.value: BinaryBlockGene,
+                 GeneType.EnumType.value: EnumGene}
 
 
 def mutate(gene_type: GeneType.IntType, range_config: dict, value, values: list, mutator: Mutator.Crossover,
-           mutator_params: dict):
-    # TODO: This works but can get cleaned up to be a one liner
-    _ = dict
+           mutator_params: dict, rng=None):
+    """
+    Mutate a value of gene_type, mutator_params holds the mutator weights of every type, either as compiled by
+    compile_mutators or as written in the settings. Every draw comes from rng, a numpy.random.Generator.
+    """
     if gene_type is None:
-        _ = value
-    if gene_type == 'int':
-        frequency = mutator_params.get('int')
-        mutator = select_mutator(frequency)
-        _ = IntGene(range_config,
-                    values,
-                    mutator,
-                    mutator_params
-                    ).mutate()
-    if gene_type == 'float':
-        frequency = mutator_params.get('float')
-        mutator = select_mutator(frequency)
-        _ = FloatGene(range_config,
-                      values,
-                      mutator,
-                      mutator_params
-                      ).mutate()
-    if gene_type == 'bool':
-        frequency = mutator_params.get('bool')
-        mutator = select_mutator(frequency)
-        _ = BooleanGene(range_config,
+        return value
+    # GeneType members don't hash like their param_type string
+    gene_type = getattr(gene_type, 'value', gene_type)
+    gene_mutator = GENE_MUTATORS.get(gene_type)
+    if gene_mutator is None:
+        return dict
+
+    mutator = select_mutator(mutator_params.get(gene_type), rng)
+    return gene_mutator(range_config,
                         values,
                         mutator,
-                        mutator_params
+                        mutator_params,
+                        rng
                         ).mutate()
-    if gene_type == 'binary_block':
-        frequency = mutator_params.get('binary_block')
-        mutator = select_mutator(frequency)
-        _ = BinaryBlockGene(range_config,
-                            values,
-                            mutator,
-                            mutator_params
-                            ).mutate()
-    if gene_type == 'enum':   
-        frequency = mutator_params.get('enum')
-        mutator = select_mutator(frequency)
-        _ = EnumGene(range_config,
-                     values,
-                     mutator,
-                     mutator_params
-                     ).mutate()
-                     
-    return _
@@ -19,14 +19,14 @@ from toga.utils import goodness_of_fit
 
 class IntGene(GeneMutate):
 
-    def __init__(self,  dictionary=None, parents=None, mutator=Mutator.Crossover, mutator_params={}):
+    def __init__(self,  dictionary=None, parents=None, mutator=Mutator.Crossover, mutator_params={}, rng=None):
         self.dictionary = dictionary if dictionary is not None else {}
         self.parents = parents
         self.mutator_params = mutator_params if mutator_params is not None else {}
         self.percentage = self.mutator_params.get('percentage') if self.mutator_params.get(
             'percentage') is not None else 1.0
         self.frequency = self.mutator_params.get('frequency')
-        super().__init__(dictionary, parents, mutator)
+        super().__init__(dictionary, parents, mutator, rng)
 
     def mutate(self):
         return super().mutate()
@@ -36,23 +36,24 @@ class IntGene(GeneMutate):
 
         :return:
 
-        >>> np.random.seed(0)
+        >>> t = IntGene()
+        >>> t.rng = np.random.default_rng(0)
         >>> t.parents = [23, 45, 97]
         >>> t.crossover()
         97
 
-        >>> np.random.seed(0)
+        >>> t.rng = np.random.default_rng(0)
         >>> t.parents = [-99]
         >>> t.crossover()
         -99
 
-        >>> np.random.seed(0)
+        >>> t.rng = np.random.default_rng(0)
         >>> t.parents = [5, 19]
         >>> t.crossover()
         19
         """
         if self.parents:
-            value = np.random.choice([x for x in self.parents], size=1, replace=False).tolist()[0]
+            value = self.random_parent()
             return value
         else:
             return self.random()
@@ -62,6 +63,7 @@ class IntGene(GeneMutate):
         :return: Random results from allowed range
 
 
+        >>> t = IntGene()
         >>> t.dictionary = {}
         >>> t.random()
         Traceback (most recent call last):
@@ -78,7 +80,7 @@ class IntGene(GeneMutate):
         >>> hist, bins = np.histogram(results)
         >>> _min = min(hist)
         >>> _max = max(hist)
-        >>> alpha > (_max - _min)
+        >>> bool(alpha > (_max - _min))
         True
 
         >>> t.dictionary = {'range': [0, 10]}
@@ -92,7 +94,7 @@ class IntGene(GeneMutate):
         >>> _min = min(hist)
         >>> _max = max(hist)
         >>> alpha = 0.01 * sample_size
-        >>> alpha > (_max - _min)
+        >>> bool(alpha > (_max - _min))
         True
         """
         values = self.dictionary.get('range')
@@ -100,15 +102,17 @@ class IntGene(GeneMutate):
             raise Exception("Range not defined at {}".format(self.__repr__()))
         low = min(values)
         high = max(values)
-        val = np.random.randint(low, high=high)
+        val = self.rng.integers(low, high)
         return int(val)
 
     def gaussian_step(self):
         """
-        >>> np.random.seed(0)
+        >>> t = IntGene()
+        >>> t.rng = np.random.default_rng(0)
         >>> t.dictionary = {'range': [-10, 10]}
         >>> t.parents = [5]
         >>> t.gaussian_step()
+        6
 
         :return:
         """
@@ -118,7 +122,7 @@ class IntGene(GeneMutate):
             values = self.dictionary.get('range')
 
             scale = np.abs((max(values) - min(values)))
-            new_var = np.random.normal(loc=original, scale=scale/4)
+            new_var = self.rng.normal(loc=original, scale=scale/4)
             new_var = max(min(values), new_var)
             new_var = min(max(values), new_var)
             
@@ -132,6 +136,11 @@ class IntGene(GeneMutate):
         """
 
         :return:
+
+        >>> t = IntGene({'range': [0, 10]}, rng=np.random.default_rng(0))
+        >>> results = [t.gaussian_random() for _ in range(1000)]
+        >>> min(results) >= 0 and max(results) < 10
+        True
         """
         values = self.dictionary.get('range')
         lower, upper = min(values), max(values)
@@ -139,8 +148,8 @@ class IntGene(GeneMutate):
         mu, sigma = np.mean(_range), 3
         _trunc = stats.truncnorm(
             (lower - mu) / sigma, (upper - mu) / sigma, loc=mu, scale=sigma)
-        out = _trunc.rvs(1)
-        return int(out)
+        # inverse CDF of a uniform draw, scipy only takes a Generator as random_state from 1.4
+        return int(_trunc.ppf(self.rng.random()))
 
     def scaled(self):
         values = self.dictionary.get('range')
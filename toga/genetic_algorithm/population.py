@@ -10,13 +10,18 @@ Notes :
 Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
 U.S. Government Sponsorship acknowledged.
 """
+import logging
+import secrets
 import uuid
 
 import numpy
-import yaml
 
+from toga.genetic_algorithm.gene_structure.flatgenetree import FlatGeneTree
+from toga.genetic_algorithm.gene_structure.genetemplate import GeneTemplate
 from toga.genetic_algorithm.gene_structure.genetree import GeneTree
 from toga.genetic_algorithm.gene_structure.invdividual import Metrics, Individual, Genetics, Lineage
+from toga.genetic_algorithm.mutate.batchmutate import BatchMutate
+from toga.genetic_algorithm.mutate.handle_type import MutatorTable, compile_mutators
 from toga.optimization_state.paretofrontier import ParetoFrontier
 from toga.toga_settings import Settings
 
@@ -31,42 +36,100 @@ class Population(object):
         self.base_gene = self.settings.gene_template
         self.gene_mutation_scale = self.settings.gene_mutation_scale
         self.gene_mutation_type = self.settings.active_mutators_by_type
+        # weights compiled once instead of normalized again for every draw
+        self.scale_table = MutatorTable(self.gene_mutation_scale)
+        self.type_tables = compile_mutators(self.gene_mutation_type)
         self.optimization_strategy = self.settings.optimization_strategy
 
         self.population = None
+        self.batch_mutate = None  # BatchMutate of the last template used by create_individuals
+
+        # every individual gets its own Generator spawned from the experiment seed, in the order they're created
+        self.seed = self.settings.seed if self.settings.seed is not None else secrets.randbits(63)
+        self.seed_stream = self.settings.seed_stream
+        self.seed_sequence = numpy.random.SeedSequence(self.seed, spawn_key=(self.seed_stream,))
+        logging.info(f'Experiment seed {self.seed}, stream {self.seed_stream}')
+
+    def spawn_rng(self):
+        """
+        Generator of the next individual
+
+        :return: numpy.random.Generator and the seed to record in its Lineage
+        """
+        seed_sequence = self.seed_sequence.spawn(1)[0]
+        return numpy.random.default_rng(seed_sequence), {'entropy': seed_sequence.entropy,
+                                                         'spawn_key': list(seed_sequence.spawn_key)}
+
+    @staticmethod
+    def rng_from_seed(seed):
+        """
+        Generator an individual was mutated with, to reproduce it
+
+        :param seed: the seed of its Lineage
+        :return: numpy.random.Generator
+        """
+        return numpy.random.default_rng(numpy.random.SeedSequence(seed['entropy'],
+                                                                  spawn_key=tuple(seed['spawn_key'])))
 
     def create_individual(self, config):
-        try:
-            with open(config, 'r') as f:
-                gene = yaml.safe_load(f)
-        except yaml.YAMLError as exc:
-            print(exc)
+        # parsed once and kept until the template file changes
+        template = GeneTemplate.load(config)
         individual = Individual(uuid=uuid.uuid4().hex)
-        individual.genetics, individual.lineage = self.mutate(config=gene)
+        rng, seed = self.spawn_rng()
+        individual.genetics, individual.lineage = self.mutate(config=template.config, rng=rng, seed=seed,
+                                                              flat=template.flat)
 
         _metrics = Metrics(fitness_metrics=self.settings.optimization_metrics, maximize=self.optimization_strategy)
         individual.metrics = _metrics
         return individual
 
-    def get_random_parents(self):
-        active = self.pareto_frontier.current_frontier()
-        if not active:
-            return []
-        keys = list(active.keys())
-        binIDs = numpy.random.choice(len(keys), 2, replace=True)
-        parents = []
-        for id in binIDs:
-            parents.append(numpy.random.choice(active[keys[id]], replace=True))
-        return parents
-
-    def select_mutator(self):
-        scale = self.gene_mutation_scale
-        if scale:
-            selection = list(scale.keys())
-            raw = list(scale.values())
-            weights = [float(i) / sum(raw) for i in raw]
-            return str(numpy.random.choice(selection, 1, replace=True, p=weights)[0])
-        return ""
+    def create_individuals(self, config, amount):
+        """
+        Create a batch of individuals with the vectorized BatchMutate instead of a GeneTree per individual
+
+        :param config: path of the gene template
+        :param amount: how many individuals
+        :return: list of Individual
+        """
+        template = GeneTemplate.load(config)
+        if self.batch_mutate is None or self.batch_mutate.layout is not template.layout:
+            self.batch_mutate = BatchMutate(template.layout, type_probability=self.type_tables)
+
+        # one Generator for the whole batch, each individual records it with its row in the batch
+        rng, seed = self.spawn_rng()
+
+        # two elites per individual, as get_random_parents draws for each one
+        elites = self.pareto_frontier.random_elites(2 * amount, rng)
+        if elites:
+            parents = template.layout.encode(self.load_parents(elites))
+            children = self.batch_mutate.generate(amount, parents=parents,
+                                                  pairs=numpy.arange(2 * amount).reshape(amount, 2), rng=rng)
+        else:
+            children = self.batch_mutate.generate(amount, rng=rng)
+
+        individuals = []
+        for index, gene in enumerate(template.layout.decode(children)):
+            individual = Individual(uuid=uuid.uuid4().hex)
+            individual.genetics = Genetics(gene=gene)
+            if elites:
+                parent1, parent2 = elites[2 * index], elites[2 * index + 1]
+                individual.lineage = Lineage(mutator=self.select_mutator(rng), parent1=parent1, parent2=parent2,
+                                             generation_num=1 + parent1['lineage']['generation_num'] +
+                                             parent2['lineage']['generation_num'],
+                                             seed=dict(seed, batch_index=index))
+            else:
+                individual.lineage = Lineage(mutator=self.select_mutator(rng), parent1=None, parent2=None,
+                                             generation_num=0, seed=dict(seed, batch_index=index))
+            individual.metrics = Metrics(fitness_metrics=self.settings.optimization_metrics,
+                                         maximize=self.optimization_strategy)
+            individuals.append(individual)
+        return individuals
+
+    def get_random_parents(self, rng=None):
+        return self.pareto_frontier.random_elites(2, rng)
+
+    def select_mutator(self, rng=None):
+        return self.scale_table.select(rng)
 
     @staticmethod
     def load_parents(parents):
@@ -78,14 +141,24 @@ class Population(object):
                 _parents.append(gene)
         return _parents
 
-    def mutate(self, config):
-        parents = self.get_random_parents()
-        mutator = self.select_mutator()
+    def mutate_gene(self, config, parents, mutator, rng=None, flat=None):
+        """
+        Gene mutated from the parents, with a FlatGeneTree if the FlatGeneTemplate of config is given and a GeneTree
+        otherwise
+        """
+        mutator_params = {'type_probability': self.type_tables}
+        if flat is not None:
+            return FlatGeneTree(flat, parents=parents, mutator_params=mutator_params, rng=rng).mutate()
+        return GeneTree(config=config, parents=parents, mutator=mutator, mutator_params=mutator_params,
+                        rng=rng).mutate()
+
+    def mutate(self, config, rng=None, seed=None, flat=None):
+        parents = self.get_random_parents(rng)
+        mutator = self.select_mutator(rng)
 
         if not parents:
-            gene = Genetics(GeneTree(config=config, parents=None, mutator=mutator,
-                                     mutator_params={'type_probability': self.gene_mutation_type}).mutate())
-            lineage = Lineage(mutator=mutator, parent1=None, parent2=None, generation_num=0)
+            gene = Genetics(self.mutate_gene(config, None, mutator, rng, flat))
+            lineage = Lineage(mutator=mutator, parent1=None, parent2=None, generation_num=0, seed=seed)
             return gene, lineage
 
         parent1 = parents[0]
@@ -93,8 +166,7 @@ class Population(object):
 
         _parents = self.load_parents(parents)
 
-        gene = Genetics(gene=GeneTree(config=config, parents=_parents, mutator=mutator,
-                                      mutator_params={'type_probability': self.gene_mutation_type}).mutate())
+        gene = Genetics(gene=self.mutate_gene(config, _parents, mutator, rng, flat))
 
         gn = 1 #Add one for this mutation
         if parent1:
@@ -105,7 +177,8 @@ class Population(object):
         lineage = Lineage(mutator=mutator,
                           parent1=parent1,
                           parent2=parent2,
-                          generation_num=gn)
+                          generation_num=gn,
+                          seed=seed)
 
         return gene, lineage
 
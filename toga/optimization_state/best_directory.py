@@ -0,0 +1,160 @@
+"""
+Date  : 10/18/26
+
+Brief : Keeps the best directory in sync with the archive by only writing and removing the elites that changed
+
+Notes : Files are written to a temporary name and renamed into place so best/ never holds a partial file and is never
+        emptied while it's being updated.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import os
+
+import yaml
+
+
+def best_path(best_dir, individual):
+    """
+    File name a high performer is stored under, built from its metrics and uuid
+
+    :param best_dir: the best directory of the experiment
+    :param individual: individual as a dictionary
+    :return: path or None if the individual has no metrics
+
+    >>> best_path('best', {'uuid': 'abc', 'metrics': {'banana': 1.5, 'sinc': -0.25}})
+    'best/banana_1.5_sinc_-0.25_uuid_abc.yml'
+    """
+    metrics = individual.get('metrics')
+    if metrics is None:
+        return None
+    out = ''
+    for key, item in metrics.items():
+        assert not isinstance(item, dict)
+        out += f'{key}_{item}_'
+    uuid = individual.get('uuid')
+    return os.path.join(best_dir, f'{out}uuid_{uuid}.yml')
+
+
+def uuid_from_path(path):
+    """
+    Inverse of best_path for the uuid
+
+    >>> uuid_from_path('best/banana_1.5_sinc_-0.25_uuid_abc.yml')
+    'abc'
+    """
+    name = os.path.basename(path)
+    return name[name.rfind('_uuid_') + len('_uuid_'):-len('.yml')]
+
+
+def write_changes(added, removed):
+    """
+    Write the added individuals and unlink the removed files. Only uses its arguments so it can run in a separate
+    process.
+
+    :param added: list of (path, individual)
+    :param removed: list of paths
+    :return:
+    """
+    for path, individual in added:
+        directory, name = os.path.split(path)
+        os.makedirs(directory, exist_ok=True)
+        temporary = os.path.join(directory, f'.{name}.tmp')
+        with open(temporary, 'w') as f:
+            yaml.dump(individual, f)
+        os.replace(temporary, path)
+
+    for path in removed:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class BestDirectory(object):
+    """
+    Remembers which file holds each elite so a flush only touches the files of elites added or evicted since the
+    previous flush
+
+    >>> import tempfile
+    >>> import shutil
+    >>> temp_dir = tempfile.mkdtemp()
+    >>> best = BestDirectory(temp_dir)
+    >>> a = {'uuid': 'a', 'metrics': {'banana': 1.0, 'sinc': 0.5}}
+    >>> b = {'uuid': 'b', 'metrics': {'banana': 2.0, 'sinc': 0.1}}
+    >>> added, removed = best.flush([a, b])
+    >>> len(added), len(removed)
+    (2, 0)
+    >>> best.flush([a, b])
+    ([], [])
+    >>> added, removed = best.flush([a])
+    >>> sorted(os.listdir(temp_dir))
+    ['banana_1.0_sinc_0.5_uuid_a.yml']
+    >>> BestDirectory(temp_dir).flush([a])
+    ([], [])
+    >>> shutil.rmtree(temp_dir)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = None  # uuid -> path of every elite file in directory, read from disk on first use
+
+    def load(self):
+        self.files = {}
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.yml') and not name.startswith('.'):
+                    path = os.path.join(self.directory, name)
+                    self.files[uuid_from_path(path)] = path
+
+    def diff(self, population):
+        """
+        Compare the population with the files on disk
+
+        :param population: list of individuals as dictionaries
+        :return: (added, removed) where added is a list of (path, individual) and removed a list of paths
+        """
+        if self.files is None:
+            self.load()
+
+        current = {}
+        for individual in population:
+            path = best_path(self.directory, individual)
+            if path is not None:
+                current[individual.get('uuid')] = (path, individual)
+
+        added = [(path, individual) for uuid, (path, individual) in current.items() if self.files.get(uuid) != path]
+        removed = [path for uuid, path in self.files.items() if uuid not in current or current[uuid][0] != path]
+        return added, removed
+
+    def commit(self, added, removed):
+        """
+        Record that the output of diff has been written
+
+        :param added: list of (path, individual)
+        :param removed: list of paths
+        :return:
+        """
+        for path in removed:
+            uuid = uuid_from_path(path)
+            if self.files.get(uuid) == path:
+                del self.files[uuid]
+        for path, individual in added:
+            self.files[individual.get('uuid')] = path
+
+    def flush(self, population):
+        """
+        Write the files of new elites and remove those of evicted ones
+
+        :param population: list of individuals as dictionaries
+        :return: (added, removed)
+        """
+        added, removed = self.diff(population)
+        write_changes(added, removed)
+        self.commit(added, removed)
+        return added, removed
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
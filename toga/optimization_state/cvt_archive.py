@@ -0,0 +1,190 @@
+"""
+Date  : 10/18/26
+
+Brief : MAP-Elites archive whose bins are the cells of a centroidal Voronoi tessellation of the fixed axes
+
+Notes : The number of bins of a grid grows exponentially with the number of fixed axes, a CVT has a set number of
+        bins however many axes there are. The centroids are computed once with Lloyd's algorithm over uniform samples
+        of the unit hypercube, cached in cache_dir and scaled to the range of each fixed axis. Every client computes
+        the same centroids from the same seed, so bin labels agree between the server and clients. Individuals are
+        assigned to their nearest centroid with a KD-tree.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import logging
+import os
+
+import numpy
+from scipy.spatial import cKDTree
+
+from toga.optimization_state.gridarchive import GridArchive
+
+
+def compute_centroids(dimensions, count, samples=100000, iterations=20, seed=0):
+    """
+    Lloyd's algorithm over uniform samples of the unit hypercube
+
+    :param dimensions: number of fixed axes
+    :param count: number of centroids
+    :param samples: uniform samples the centroids are fit to
+    :param iterations: Lloyd iterations
+    :param seed: seed of the samples and initial centroids
+    :return: (count, dimensions) array of centroids in [0, 1]
+
+    >>> centroids = compute_centroids(2, 4, samples=1000, iterations=10)
+    >>> centroids.shape
+    (4, 2)
+    >>> bool(((centroids > 0) & (centroids < 1)).all())
+    True
+    """
+    random = numpy.random.RandomState(seed)
+    points = random.uniform(size=(max(samples, count), dimensions))
+    centroids = points[random.choice(len(points), count, replace=False)].copy()
+
+    for _ in range(iterations):
+        _, nearest = cKDTree(centroids).query(points)
+        counts = numpy.bincount(nearest, minlength=count)
+        occupied = counts > 0
+        for axis in range(dimensions):
+            sums = numpy.bincount(nearest, weights=points[:, axis], minlength=count)
+            centroids[occupied, axis] = sums[occupied] / counts[occupied]
+    return centroids
+
+
+def load_centroids(cache_dir, dimensions, count, samples=100000, iterations=20, seed=0):
+    """
+    compute_centroids, read from cache_dir when they were computed before
+
+    :param cache_dir: directory of the cached centroids, nothing is cached if None
+    :return: (count, dimensions) array of centroids in [0, 1]
+    """
+    if cache_dir is None:
+        return compute_centroids(dimensions, count, samples, iterations, seed)
+
+    path = os.path.join(cache_dir, f'centroids_{dimensions}d_{count}_{samples}_{iterations}_{seed}.npy')
+    if os.path.exists(path):
+        return numpy.load(path)
+
+    logging.info(f'Computing {count} centroids over {dimensions} axes')
+    centroids = compute_centroids(dimensions, count, samples, iterations, seed)
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        numpy.save(f, centroids)
+    os.replace(temporary, path)
+    return centroids
+
+
+class CVTArchive(GridArchive):
+    """
+
+    >>> from toga.optimization_state.metrics import Metrics
+    >>> settings = {'banana': {'fixed_axis': True, 'range': [0, 400], 'partitions': 40, 'index': 0},
+    ...             'foo': {'fixed_axis': True, 'range': [0, 1], 'partitions': 40, 'index': 1},
+    ...             'sinc': {'fixed_axis': False, 'range': [-0.5, 0.5], 'partitions': 10, 'index': 2}
+    ...             }
+    >>> archive = CVTArchive(fitness_metrics=Metrics(input_dictionary=settings).metrics, amount_per_bin=2,
+    ...                      centroids=16, samples=2000)
+    >>> archive.scores.shape
+    (16, 2)
+    >>> _, updated = archive.update_from_population([{'uuid': 'a', 'metrics': {'banana': 0, 'foo': 0, 'sinc': 0.3}},
+    ...                                              {'uuid': 'b', 'metrics': {'banana': 1, 'foo': 0, 'sinc': 0.1}},
+    ...                                              {'uuid': 'c', 'metrics': {'banana': 400, 'foo': 1, 'sinc': 0.2}}])
+    >>> sorted(len(individuals) for individuals in archive.get_non_empty_bins().values())
+    [1, 2]
+    >>> archive.get_corresponding_bin({'metrics': {'banana': 0, 'foo': 0, 'sinc': 0.3}})[0]
+    'centroid'
+    >>> settings['foo']['range'] = [1, 1]
+    >>> archive = CVTArchive(fitness_metrics=Metrics(input_dictionary=settings).metrics, centroids=16, samples=2000)
+    >>> cells = archive.get_corresponding_cells([{'metrics': {'banana': 0, 'foo': 1}},
+    ...                                          {'metrics': {'banana': 0, 'foo': 5}}])
+    >>> bool(cells[0] == cells[1])
+    True
+    """
+
+    KEY = 'centroid'
+
+    def __init__(self, fitness_metrics=[], maximize=True, amount_per_bin=1, history_log="", centroids=1000,
+                 samples=100000, iterations=20, seed=0, cache_dir=None):
+        self.centroid_count = centroids
+        self.samples = samples
+        self.iterations = iterations
+        self.seed = seed
+        self.cache_dir = cache_dir
+        super().__init__(fitness_metrics=fitness_metrics,
+                         maximize=maximize,
+                         amount_per_bin=amount_per_bin,
+                         history_log=history_log)
+
+    def create_initial(self):
+        self._split_metrics()
+        if not self.fixed_metrics:
+            raise Exception("The cvt archive needs at least one fixed axis")
+
+        self.lower = numpy.array([min(metric.axis_range) for metric in self.fixed_metrics], dtype=float)
+        self.upper = numpy.array([max(metric.axis_range) for metric in self.fixed_metrics], dtype=float)
+        # an axis whose range is a single value can't separate centroids, it's scaled to 0 instead of dividing by 0
+        width = self.upper - self.lower
+        self.scale = numpy.divide(1.0, width, out=numpy.zeros_like(width), where=width > 0)
+
+        unit_centroids = load_centroids(self.cache_dir, len(self.fixed_metrics), self.centroid_count, self.samples,
+                                        self.iterations, self.seed)
+        self.tree = cKDTree(unit_centroids)
+        self.centroids = self.lower + unit_centroids * (self.upper - self.lower)
+        self.labels = [str(index) for index in range(len(unit_centroids))]
+
+        self.shape = (len(unit_centroids),)
+        self._allocate(len(unit_centroids))
+
+    def get_corresponding_cells(self, population):
+        """
+        Nearest centroid of every individual, with one KD-tree query for the whole population
+
+        :param population: list of individuals that all have metrics
+        :return: numpy array of cell indices
+        """
+        values = numpy.array([[individual['metrics'][metric.name] for metric in self.fixed_metrics]
+                              for individual in population], dtype=float).reshape(len(population), -1)
+        _, cells = self.tree.query((values - self.lower) * self.scale)
+        return numpy.asarray(cells, dtype=numpy.int64)
+
+    def _key_path(self, cell):
+        return self.KEY, self.labels[cell], self.free_metric.name
+
+    def bin_key_paths(self):
+        for cell in range(len(self.labels)):
+            yield self._key_path(cell)
+
+    def get_dictionary(self):
+        """
+
+        :return: {'centroid': {label: {free metric: individuals}}}
+        """
+        return {self.KEY: {label: {self.free_metric.name: self._cell_individuals(cell)}
+                           for cell, label in enumerate(self.labels)}}
+
+    def get_points(self):
+        """
+        Points to plot, the coordinates of every centroid along the fixed metrics followed by its best value, so Plot
+        draws them against the metric values rather than the centroid labels
+
+        :return: list of (fixed metric values..., best value)
+
+        >>> from toga.optimization_state.metrics import Metrics
+        >>> settings = {'banana': {'fixed_axis': True, 'range': [0, 400], 'partitions': 40, 'index': 0},
+        ...             'sinc': {'fixed_axis': False, 'range': [-0.5, 0.5], 'partitions': 10, 'index': 1}}
+        >>> archive = CVTArchive(fitness_metrics=Metrics(input_dictionary=settings).metrics, centroids=8, samples=1000)
+        >>> _ = archive.update_from_population([{'uuid': 'a', 'metrics': {'banana': 390.0, 'sinc': 0.3}}])
+        >>> [(round(x), value) for x, value in archive.get_points() if value is not None]
+        [(378, 0.3)]
+        """
+        best = self._to_cost(self.scores[:, 0])
+        occupied = self.slots[:, 0] != self.EMPTY
+        return [tuple(coordinates) + (float(value) if is_occupied else None,)
+                for coordinates, value, is_occupied in zip(self.centroids.tolist(), best, occupied)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
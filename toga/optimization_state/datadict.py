@@ -11,9 +11,8 @@ Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
 U.S. Government Sponsorship acknowledged.
 """
 import collections
-from collections import Mapping
-import copy
-import json
+from collections.abc import Mapping
+import itertools
 import numpy
 from operator import add
 import os
@@ -21,21 +20,53 @@ import threading
 
 import string
 import random
+import uuid
 
 import yaml
 
+from toga.optimization_state.history_log import HistoryLog
+
 class DataDict(object):
     _FLAG_FIRST = object()
 
+    # how many accepted inserts are remembered for clients asking for changes since a version
+    CHANGE_LOG_SIZE = 10000
+
     def __init__(self, fitness_metrics=[], maximize=True, amount_per_bin=1, history_log=""):
         self.fitness_metrics = fitness_metrics
         self.maximize = maximize
         self.amount_per_bin = amount_per_bin
+
+        # bin edges and labels are fixed by the metric ranges so they're built once and reused for every lookup
+        self.bin_edges = {metric.name: metric.bin_edges() for metric in self.fitness_metrics if metric.fixed_axis}
+        self.bin_labels = {metric.name: metric.bin_labels() for metric in self.fitness_metrics if metric.fixed_axis}
+
+        # index of the bins holding at least one individual, kept up to date on insert for cheap parent sampling
+        self.occupied_bins = []
+        self._occupied = {}
+
+        # uuids of every stored individual, the same individual can arrive more than once when syncing with the server
+        self.uuids = set()
+
+        # every accepted insert bumps the version and logs the bin it landed in, so clients can sync only what changed
+        self.archive_id = uuid.uuid4().hex
+        self.version = 0
+        self.changes = collections.deque(maxlen=self.CHANGE_LOG_SIZE)
+
+        # running quality diversity statistics, updated when an insert improves the best of a bin
+        self.free_metric_name = next((metric.name for metric in self.fitness_metrics if not metric.fixed_axis), None)
+        self.bin_bests = {}
+        self.bin_improvements = collections.Counter()
+        self.qd_score = 0.0
+        self.best = None
+        self.best_bin = None
+
         self.dictionary = self.create_initial()
         self.trial_count = 0
         self.trial_count_lock = threading.Lock()
         self.track_history = history_log is not None and len(history_log) > 0
         self.history_log = history_log
+        self.history = HistoryLog(history_log) if self.track_history else None
 
     def get_dictionary(self):
         """
@@ -66,37 +97,31 @@ class DataDict(object):
         """
         updated_individuals = []
 
-        def update(_dict={}, key_path=[], value=None):
-            _sub = _dict
-            for index, item in enumerate(key_path):
-                if item in _sub:
-                    if index == len(key_path) - 1:
-                        items = _sub[item]
-                        if not items:
-                            _sub[item] = [value]
-                        else:
-                            items.append(value)
-                            items.sort(key=lambda x: x['metrics'][key_path[-1]], reverse=self.maximize)
-                            _sub[item] = items[:self.amount_per_bin]
-
-                        if any(x['uuid'] == value['uuid'] for x in _sub[item]):
-                            updated_individuals.append(value)
-                    else:
-                        _sub = _sub[item]
-            return _dict
-
-        for individual in population:
-            if self.has_metrics(individual):
-                key_path = self.get_corresponding_bin(individual)
-                self.dictionary = update(_dict=self.dictionary, key_path=key_path, value=individual)
+        population = [individual for individual in population if self.has_metrics(individual)]
+        for individual, key_path in zip(population, self.get_corresponding_bins(population)):
+            key_path = tuple(key_path)
+            items = self._bin(key_path)
+            if items is not None and self.insert_bounded(items, individual, key_path[-1]):
+                self._mark_occupied(key_path, items)
+                self._record_change(key_path)
+                updated_individuals.append(individual)
 
-        if self.track_history and len(updated_individuals) > 0:
-            for new_item in updated_individuals:
-                with open(self.history_log, "a") as f:
-                    f.write(str(self.trial_count) + ": " + str(new_item['metrics']) + "\n")
+        self._log_history(updated_individuals)
 
         return self.dictionary, updated_individuals
 
+    def _log_history(self, updated_individuals):
+        if self.track_history and len(updated_individuals) > 0:
+            self.history.write(self.trial_count, updated_individuals)
+
+    def flush_history(self):
+        if self.history is not None:
+            self.history.flush()
+
+    def close_history(self):
+        if self.history is not None:
+            self.history.close()
+
     def has_metrics(self, individual):
         """
 
@@ -142,30 +167,18 @@ class DataDict(object):
             }
         """
 
-        input_arr = copy.deepcopy(self.fitness_metrics)
-        if not input_arr:
+        if not self.fitness_metrics:
             raise Exception("No metrics exist\nName metrics inside the Metrics: fitness: section in the run_config yml")
 
-        def helper(dictionary, array):
-            _dict = {}
-
+        # every bin gets a list of its own so the result needs no copying
+        def helper(array):
             if not array:
-                return dictionary
-            _ = array[-1]
-
+                return {}
+            _ = array[0]
             if not _.fixed_axis:
-                _dict[_.name] = []
-                return helper(_dict, array[:-1])
-            else:
-                _range = _.axis_range
-                partitions = array[-1].partitions
-                #Solve fencepost problem here
-                #We need N bins so we create N+1 evenly spaced fenceposts with numpy.linspace
-                #Only need left endpoint of each bin, so throwaway the last one
-                bin_labels = numpy.linspace(min(_range), max(_range), num=partitions+1)[:-1]
-                _dict[_.name] = {round(el, 2): dictionary for el in bin_labels}
-                return helper(_dict, array[:-1])
-        return json.loads(json.dumps(helper({}, input_arr)))
+                return {_.name: []}
+            return {_.name: {el: helper(array[1:]) for el in self.bin_labels[_.name]}}
+        return helper(self.fitness_metrics)
 
     def serialize(self, basedir):
         """
@@ -186,50 +199,305 @@ class DataDict(object):
         walk(self.dictionary, basedir)
         return population
 
-    def deep_update(self, source, overrides):
+    def deep_update(self, source, overrides, key_path=()):
         """
 
         :param source:
         :param overrides:
+        :param key_path: keys leading from the root of the dictionary to source
         :return:
         """
         for key, value in overrides.items():
-            if isinstance(value, collections.Mapping) and value:
-                returned = self.deep_update(source.get(key, {}), value)
-                source[key] = returned
+            if isinstance(value, Mapping) and value:
+                returned = self.deep_update(source.get(key, {}), value, key_path + (key,))
+                if returned or key in source:
+                    source[key] = returned
             else:
                 items = []
                 if source.get(key):
                     items = source[key]
-                items.extend(overrides[key])
-                items = sorted(items, key=lambda x: x['metrics'][key], reverse=self.maximize)
-                items = items[:self.amount_per_bin]
-                source[key] = items
+                for item in overrides[key]:
+                    if self.insert_bounded(items, item, key):
+                        self._mark_occupied(key_path + (key,), items)
+                        self._record_change(key_path + (key,))
+                if items or key in source:
+                    source[key] = items
         return source
 
+    def _bin(self, key_path):
+        """
+
+        :param key_path: keys leading from the root of the dictionary to a bin
+        :return: the bin's list or None if the dictionary has no such bin
+        """
+        _sub = self.dictionary
+        for item in key_path:
+            if item not in _sub:
+                return None
+            _sub = _sub[item]
+        return _sub
+
+    def _mark_occupied(self, key_path, items):
+        if key_path not in self._occupied:
+            self.occupied_bins.append(key_path)
+        self._occupied[key_path] = items
+
+    def _record_change(self, key):
+        self.version += 1
+        self.changes.append((self.version, key))
+        self._update_statistics(key)
+
+    def _update_statistics(self, key):
+        best = self._bin_best(key)
+        previous = self.bin_bests.get(key)
+        if previous is not None and not self._is_better(best, previous):
+            return
+
+        self.bin_bests[key] = best
+        self.qd_score += best - (previous or 0.0)
+        self.bin_improvements[key] += 1
+        if self.best is None or self._is_better(best, self.best):
+            self.best = best
+            self.best_bin = key
+
+    def _bin_best(self, key):
+        return self._occupied[key][0]['metrics'][self.free_metric_name]
+
+    def bin_count(self):
+        count = 1
+        for metric in self.fitness_metrics:
+            if not metric.fixed_axis:
+                break
+            count *= len(self.bin_labels[metric.name])
+        return count
+
+    def get_statistics(self, bins=False):
+        """
+        Quality diversity statistics of the archive, kept up to date on insert so reading them doesn't walk the bins
+
+        :param bins: also list the best and number of improvements of every occupied bin
+        :return: dictionary
+
+        >>> from toga.optimization_state.metrics import Metrics
+        >>> settings = {'banana': {'fixed_axis': True, 'range': [0, 400], 'partitions': 40, 'index': 0},
+        ...             'sinc': {'fixed_axis': False, 'range': [-0.5, 0.5], 'partitions': 10, 'index': 1}
+        ...             }
+        >>> datadict = DataDict(fitness_metrics=Metrics(input_dictionary=settings).metrics, amount_per_bin=2)
+        >>> _ = datadict.update_from_population([{'uuid': 'a', 'metrics': {'banana': 12.0, 'sinc': 0.25}},
+        ...                                      {'uuid': 'b', 'metrics': {'banana': 15.0, 'sinc': 0.5}},
+        ...                                      {'uuid': 'c', 'metrics': {'banana': 15.0, 'sinc': 0.0}},
+        ...                                      {'uuid': 'd', 'metrics': {'banana': 255.0, 'sinc': 0.125}}])
+        >>> statistics = datadict.get_statistics(bins=True)
+        >>> statistics['coverage'], statistics['qd_score'], statistics['best'], statistics['best_bin']
+        (0.05, 0.625, 0.5, ['banana', '10.0', 'sinc'])
+        >>> statistics['bins'][0]
+        {'key_path': ['banana', '10.0', 'sinc'], 'best': 0.5, 'improvements': 2}
+        """
+        total = self.bin_count()
+        statistics = {'bins_total': total,
+                      'bins_occupied': len(self.bin_bests),
+                      'coverage': len(self.bin_bests) / total if total else 0.0,
+                      'qd_score': self.qd_score,
+                      'best': self.best,
+                      'best_bin': self._bin_key_path(self.best_bin) if self.best_bin is not None else None,
+                      'improvements': sum(self.bin_improvements.values()),
+                      'trial_count': self.trial_count,
+                      'version': self.version}
+        if bins:
+            statistics['bins'] = [{'key_path': self._bin_key_path(key),
+                                   'best': best,
+                                   'improvements': self.bin_improvements[key]} for key, best in self.bin_bests.items()]
+        return statistics
+
+    def _bin_members(self, key):
+        return self._occupied[key]
+
+    def _bin_key_path(self, key):
+        return list(key)
+
+    def get_changes_since(self, version, archive_id=None):
+        """
+        The bins changed after version. Falls back to the full dictionary when the change log no longer reaches back
+        to version or the caller's version came from a different archive, such as before a server restart.
+
+        :param version: the last version the caller has seen
+        :param archive_id: the archive_id that version was read from
+        :return: dictionary with the archive id, current version and either the changed bins or the full state
+
+        >>> from toga.optimization_state.metrics import Metrics
+        >>> settings = {'banana': {'fixed_axis': True, 'range': [0, 400], 'partitions': 40, 'index': 0},
+        ...             'sinc': {'fixed_axis': False, 'range': [-0.5, 0.5], 'partitions': 10, 'index': 1}
+        ...             }
+        >>> datadict = DataDict(fitness_metrics=Metrics(input_dictionary=settings).metrics, amount_per_bin=2)
+        >>> _ = datadict.update_from_population([{'uuid': 'a', 'metrics': {'banana': 12.0, 'sinc': 0.3}},
+        ...                                      {'uuid': 'b', 'metrics': {'banana': 255.0, 'sinc': 0.1}}])
+        >>> changes = datadict.get_changes_since(1, datadict.archive_id)
+        >>> changes['version'], changes['full'], changes['bins']
+        (2, False, [{'key_path': ['banana', '250.0', 'sinc'], 'individuals': [{'uuid': 'b', 'metrics': {'banana': 255.0, 'sinc': 0.1}}]}])
+        >>> datadict.get_changes_since(2, datadict.archive_id)['bins']
+        []
+        >>> datadict.get_changes_since(2, 'another archive')['full']
+        True
+        """
+        response = {'archive': self.archive_id, 'version': self.version}
+
+        oldest = self.changes[0][0] if self.changes else self.version + 1
+        if archive_id != self.archive_id or version > self.version or version < oldest - 1:
+            response.update({'full': True, 'state': self.get_dictionary()})
+            return response
+
+        changed, seen = [], set()
+        for change_version, key in reversed(self.changes):
+            if change_version <= version:
+                break
+            if key not in seen:
+                seen.add(key)
+                changed.append(key)
+
+        response.update({'full': False,
+                         'bins': [{'key_path': self._bin_key_path(key), 'individuals': self._bin_members(key)}
+                                  for key in reversed(changed)]})
+        return response
+
+    def apply_changes(self, changes):
+        """
+        Merge the output of another archive's get_changes_since into this one
+
+        :param changes: dictionary returned by get_changes_since
+        :return:
+        """
+        if changes.get('full'):
+            self.update_from_datadict(changes.get('state', {}))
+            return
+
+        override = {}
+        for change in changes.get('bins', []):
+            _sub = override
+            key_path = change['key_path']
+            for key in key_path[:-1]:
+                _sub = _sub.setdefault(key, {})
+            _sub[key_path[-1]] = change['individuals']
+        if override:
+            self.update_from_datadict(override)
+
+    def insert_bounded(self, items, value, key):
+        """
+        Insert into a bin that is kept sorted best first and never grows past amount_per_bin. A candidate that is no
+        better than the worst member of a full bin, or that is already stored, is rejected without touching the bin,
+        otherwise its position is found with a binary search. Ties keep arrival order.
+
+        :param items: the bin, sorted best first
+        :param value: the individual to insert
+        :param key: name of the metric the bin is sorted by
+        :return: True if value was stored in the bin
+
+        >>> from toga.optimization_state.metrics import Metrics
+        >>> settings = {'f': {'fixed_axis': False, 'range': [0, 3], 'partitions': 1, 'index': 0}}
+        >>> datadict = DataDict(fitness_metrics=Metrics(input_dictionary=settings).metrics, amount_per_bin=2)
+        >>> items = []
+        >>> [datadict.insert_bounded(items, {'metrics': {'f': f}}, 'f') for f in [1, 3, 2, 0, 3]]
+        [True, True, True, False, True]
+        >>> [item['metrics']['f'] for item in items]
+        [3, 3]
+        """
+        individual_uuid = value.get('uuid')
+        if individual_uuid is not None and individual_uuid in self.uuids:
+            return False
+
+        score = value['metrics'][key]
+        if len(items) >= self.amount_per_bin and not self._is_better(score, items[-1]['metrics'][key]):
+            return False
+
+        low, high = 0, len(items)
+        while low < high:
+            middle = (low + high) // 2
+            if self._is_better(score, items[middle]['metrics'][key]):
+                high = middle
+            else:
+                low = middle + 1
+
+        items.insert(low, value)
+        self.uuids.add(individual_uuid)
+        if len(items) > self.amount_per_bin:
+            self.uuids.discard(items.pop().get('uuid'))
+        return True
+
+    def _is_better(self, score, other):
+        return score > other if self.maximize else score < other
+
     def get_corresponding_bin(self, individual):
         """
 
         :param individual:
         :return:
         """
-        key_path = []
+        return self.get_corresponding_bins([individual])[0]
 
-        _dict = self.dictionary
+    def get_corresponding_bins(self, population):
+        """
+        Look up the key path of every individual in a population with one searchsorted call per fixed axis
+
+        :param population: list of individuals that all have metrics
+        :return: list of key paths in the same order as population
+
+        >>> from toga.optimization_state.metrics import Metrics
+        >>> settings = {'banana': {'fixed_axis': True, 'range': [0, 400], 'partitions': 40, 'index': 0},
+        ...             'sinc': {'fixed_axis': False, 'range': [-0.5, 0.5], 'partitions': 10, 'index': 1}
+        ...             }
+        >>> datadict = DataDict(fitness_metrics=Metrics(input_dictionary=settings).metrics)
+        >>> datadict.get_corresponding_bins([{'metrics': {'banana': 10.0, 'sinc': 0.1}},
+        ...                                  {'metrics': {'banana': 10.5, 'sinc': 0.1}},
+        ...                                  {'metrics': {'banana': 999, 'sinc': 0.1}}])
+        [['banana', '0.0', 'sinc'], ['banana', '10.0', 'sinc'], ['banana', '390.0', 'sinc']]
+        """
+        key_paths = [[] for _ in population]
         for metric in self.fitness_metrics:
-            _dict = _dict[metric.name]
-            key_path.append(metric.name)
-            if metric.fixed_axis:
-                # get the bins for this value and sort by float if they're stored as strings for some reason
-                bins = sorted([float(i) for i in list(_dict.keys())])
-                _bin = bins[0]
-                for _ in bins:
-                    if individual['metrics'][metric.name] > _:
-                        _bin = _
-                _dict = _dict[str(_bin)]
-                key_path.append(str(_bin))
-            else:
-                return key_path
+            for key_path in key_paths:
+                key_path.append(metric.name)
+            if not metric.fixed_axis:
+                break
+            values = numpy.array([individual['metrics'][metric.name] for individual in population], dtype=float)
+            labels = self.bin_labels[metric.name]
+            for key_path, index in zip(key_paths, self.bin_index(self.bin_edges[metric.name], values)):
+                key_path.append(labels[index])
+        return key_paths
+
+    def bin_key_paths(self):
+        """
+        Enumerate the geometry of the grid, whether or not the bins have been created
+
+        :return: generator of the key path of every bin, in the order the dictionary nests them
+
+        >>> from toga.optimization_state.metrics import Metrics
+        >>> settings = {'banana': {'fixed_axis': True, 'range': [0, 400], 'partitions': 40, 'index': 0},
+        ...             'sinc': {'fixed_axis': False, 'range': [-0.5, 0.5], 'partitions': 10, 'index': 1}
+        ...             }
+        >>> datadict = DataDict(fitness_metrics=Metrics(input_dictionary=settings).metrics)
+        >>> key_paths = list(datadict.bin_key_paths())
+        >>> len(key_paths), key_paths[1]
+        (40, ('banana', '10.0', 'sinc'))
+        """
+        fixed_metrics = []
+        for metric in self.fitness_metrics:
+            if not metric.fixed_axis:
+                for labels in itertools.product(*[self.bin_labels[fixed.name] for fixed in fixed_metrics]):
+                    key_path = ()
+                    for fixed, label in zip(fixed_metrics, labels):
+                        key_path += (fixed.name, label)
+                    yield key_path + (metric.name,)
+                return
+            fixed_metrics.append(metric)
+
+    @staticmethod
+    def bin_index(edges, values):
+        """
+        A value belongs to the largest bin whose left edge it exceeds, values below every edge go in the first bin
+
+        :param edges: sorted left edges of the bins along one axis
+        :param values: array of metric values
+        :return: array of bin indices
+        """
+        return numpy.clip(numpy.searchsorted(edges, values, side='left') - 1, 0, len(edges) - 1)
 
     def flatten_dict(self, d):
         """
@@ -263,6 +531,42 @@ class DataDict(object):
         filtered = {k: v for k, v in original.items() if len(v) > 0}
         return filtered
 
+    def random_elites(self, amount, rng=None):
+        """
+        Pick a bin uniformly from the occupied bin index and then an individual uniformly from that bin, once per draw
+
+        :param amount: how many individuals to draw, with replacement
+        :param rng: numpy.random.Generator to draw from, the global numpy.random if None
+        :return: list of individuals, empty if nothing has been stored yet
+
+        >>> from toga.optimization_state.metrics import Metrics
+        >>> settings = {'banana': {'fixed_axis': True, 'range': [0, 400], 'partitions': 40, 'index': 0},
+        ...             'sinc': {'fixed_axis': False, 'range': [-0.5, 0.5], 'partitions': 10, 'index': 1}
+        ...             }
+        >>> datadict = DataDict(fitness_metrics=Metrics(input_dictionary=settings).metrics, amount_per_bin=2)
+        >>> datadict.random_elites(2)
+        []
+        >>> _ = datadict.update_from_population([{'uuid': 'a', 'metrics': {'banana': 12.0, 'sinc': 0.3}}])
+        >>> datadict.occupied_bins
+        [('banana', '10.0', 'sinc')]
+        >>> [individual['uuid'] for individual in datadict.random_elites(2)]
+        ['a', 'a']
+        """
+        if not self.occupied_bins:
+            return []
+        # random() is shared by Generator and the global numpy.random
+        rng = rng if rng is not None else numpy.random
+        bins = (rng.random(amount) * len(self.occupied_bins)).astype(int)
+        return [self._random_member(self.occupied_bins[index], rng.random()) for index in bins]
+
+    def _random_member(self, key_path, draw):
+        """
+
+        :param draw: uniform draw in [0, 1) choosing the member
+        """
+        items = self._occupied[key_path]
+        return items[int(draw * len(items))]
+
     def _get_best_metric(self, trials):
         trials = sorted(trials, key=lambda x : x['metrics'][self.fitness_metrics[-1].name], reverse=self.maximize)
         best = trials[0]
@@ -0,0 +1,272 @@
+"""
+Date  : 10/18/26
+
+Brief : Array backed MAP-Elites archive that can be used in place of the nested dictionary DataDict
+
+Notes : Every combination of fixed axis bins is one row of a (cells, amount_per_bin) array. Each row holds the
+        scores of the bin's elites sorted best first and the matching slots hold keys into an individual store.
+        Scores are stored as costs (negated when maximizing) so that every row is sorted ascending and empty slots
+        are numpy.inf.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import numpy
+
+from toga.optimization_state.datadict import DataDict
+
+
+class GridArchive(DataDict):
+
+    EMPTY = -1
+
+    def __init__(self, fitness_metrics=[], maximize=True, amount_per_bin=1, history_log=""):
+        super().__init__(fitness_metrics=fitness_metrics,
+                         maximize=maximize,
+                         amount_per_bin=amount_per_bin,
+                         history_log=history_log)
+
+    def create_initial(self):
+        """
+        Allocate the score and slot arrays for every bin of the fixed axes
+
+        >>> from toga.optimization_state.metrics import Metrics
+        >>> settings = {'banana': {'fixed_axis': True, 'range': [0, 400], 'partitions': 40, 'index': 0},
+        ...             'sinc': {'fixed_axis': False, 'range': [-0.5, 0.5], 'partitions': 10, 'index': 1}
+        ...             }
+        >>> archive = GridArchive(fitness_metrics=Metrics(input_dictionary=settings).metrics, amount_per_bin=3)
+        >>> archive.shape, archive.scores.shape, archive.slots.shape
+        ((40,), (40, 3), (40, 3))
+        """
+        self._split_metrics()
+        self.shape = tuple(len(self.bin_edges[metric.name]) for metric in self.fixed_metrics)
+        self._allocate(int(numpy.prod(self.shape)) if self.shape else 1)
+        return None
+
+    def _split_metrics(self):
+        if not self.fitness_metrics:
+            raise Exception("No metrics exist\nName metrics inside the Metrics: fitness: section in the run_config yml")
+
+        self.fixed_metrics = []
+        self.free_metric = None
+        for metric in self.fitness_metrics:
+            if not metric.fixed_axis:
+                self.free_metric = metric
+                break
+            self.fixed_metrics.append(metric)
+
+        if self.free_metric is None:
+            raise Exception("No free axis exists\nSet fixed_axis: False on the metric to optimize")
+
+    def _allocate(self, cells):
+        self.scores = numpy.full((cells, self.amount_per_bin), numpy.inf)
+        self.slots = numpy.full((cells, self.amount_per_bin), self.EMPTY, dtype=numpy.int64)
+        self.counts = numpy.zeros(cells, dtype=numpy.int64)
+
+        self.individuals = {}
+        self.uuids = {}
+        self._next_slot = 0
+
+    def get_dictionary(self):
+        """
+        Build the nested dictionary representation DataDict would have for the same archive
+
+        :return: nested dictionary keyed by metric name and bin label
+        """
+
+        def helper(axis, offset):
+            if axis == len(self.fixed_metrics):
+                return {self.free_metric.name: self._cell_individuals(offset)}
+            name = self.fixed_metrics[axis].name
+            stride = int(numpy.prod(self.shape[axis + 1:]))
+            return {name: {label: helper(axis + 1, offset + i * stride)
+                           for i, label in enumerate(self.bin_labels[name])}}
+
+        return helper(0, 0)
+
+    def update_from_datadict(self, other):
+        """
+
+        :param other: nested dictionary in the DataDict layout
+        :return:
+        """
+        population = [individual for _, items in self.flatten_dict(other) if items for individual in items]
+        self._update(population)
+
+    def update_from_population(self, population=[]):
+        """
+
+        :param population:
+        :return: the slot table and the individuals that were stored. Unlike DataDict the first item isn't the nested
+                 dictionary, building it walks every cell, call get_dictionary when it's needed
+
+        >>> from toga.optimization_state.metrics import Metrics
+        >>> settings = {'banana': {'fixed_axis': True, 'range': [0, 400], 'partitions': 40, 'index': 0},
+        ...             'sinc': {'fixed_axis': False, 'range': [-0.5, 0.5], 'partitions': 10, 'index': 1}
+        ...             }
+        >>> archive = GridArchive(fitness_metrics=Metrics(input_dictionary=settings).metrics, maximize=False,
+        ...                       amount_per_bin=2)
+        >>> population = [{'uuid': 'a', 'metrics': {'banana': 12.0, 'sinc': 0.3}},
+        ...               {'uuid': 'b', 'metrics': {'banana': 15.0, 'sinc': 0.1}},
+        ...               {'uuid': 'c', 'metrics': {'banana': 19.9, 'sinc': 0.2}},
+        ...               {'uuid': 'd', 'metrics': {'banana': 250.0, 'sinc': -0.4}}]
+        >>> _, updated = archive.update_from_population(population)
+        >>> [individual['uuid'] for individual in updated]
+        ['a', 'b', 'c', 'd']
+        >>> [individual['uuid'] for individual in archive.serialize('')]
+        ['b', 'c', 'd']
+        >>> len(archive.update_from_population([{'metrics': {'banana': 100.0, 'sinc': 0.0}},
+        ...                                     {'metrics': {'banana': 300.0, 'sinc': 0.0}}])[1])
+        2
+        """
+        updated_individuals = self._update(population)
+        self._log_history(updated_individuals)
+        return self.slots, updated_individuals
+
+    def _update(self, population):
+        population = [individual for individual in population if self.has_metrics(individual)]
+        if not population:
+            return []
+
+        cells = self.get_corresponding_cells(population)
+        costs = self._to_cost(numpy.array([individual['metrics'][self.free_metric.name]
+                                           for individual in population], dtype=float))
+
+        updated_individuals = []
+        for cell, cost, individual in zip(cells, costs, population):
+            if self._insert(cell, cost, individual):
+                updated_individuals.append(individual)
+        return updated_individuals
+
+    def _insert(self, cell, cost, individual):
+        """
+        Insert an individual into a row keeping the row sorted, rejects anything no better than a full row's worst
+
+        :return: True if the individual was stored
+        """
+        individual_uuid = individual.get('uuid')
+        if individual_uuid is not None and individual_uuid in self.uuids:
+            return False
+
+        scores = self.scores[cell]
+        slots = self.slots[cell]
+        if not cost < scores[-1]:
+            return False
+
+        if slots[0] == self.EMPTY:
+            self.occupied_bins.append(cell)
+
+        position = numpy.searchsorted(scores, cost, side='right')
+        evicted = slots[-1]
+
+        scores[position + 1:] = scores[position:-1].copy()
+        slots[position + 1:] = slots[position:-1].copy()
+        scores[position] = cost
+        slots[position] = self._next_slot
+
+        self.individuals[self._next_slot] = individual
+        if individual_uuid is not None:
+            self.uuids[individual_uuid] = self._next_slot
+        self._next_slot += 1
+
+        if evicted != self.EMPTY:
+            removed = self.individuals.pop(evicted)
+            self.uuids.pop(removed.get('uuid'), None)
+        else:
+            self.counts[cell] += 1
+
+        self._record_change(cell)
+        return True
+
+    def _bin_members(self, cell):
+        return self._cell_individuals(cell)
+
+    def _bin_key_path(self, cell):
+        return list(self._key_path(cell))
+
+    def _bin_best(self, cell):
+        return float(self._to_cost(self.scores[cell, 0]))
+
+    def bin_count(self):
+        return len(self.scores)
+
+    def _random_member(self, cell, draw):
+        return self.individuals[self.slots[cell, int(draw * self.counts[cell])]]
+
+    def _to_cost(self, values):
+        return -values if self.maximize else values
+
+    def get_corresponding_cells(self, population):
+        """
+        Vectorized lookup of the flat cell index of each individual
+
+        :param population: list of individuals that all have metrics
+        :return: numpy array of cell indices
+        """
+        if not self.fixed_metrics:
+            return numpy.zeros(len(population), dtype=numpy.int64)
+
+        indices = []
+        for metric in self.fixed_metrics:
+            values = numpy.array([individual['metrics'][metric.name] for individual in population], dtype=float)
+            indices.append(self.bin_index(self.bin_edges[metric.name], values))
+        return numpy.ravel_multi_index(indices, self.shape)
+
+    def get_corresponding_bin(self, individual):
+        """
+
+        :param individual:
+        :return: the DataDict key path of the bin this individual belongs to
+        """
+        return list(self._key_path(self.get_corresponding_cells([individual])[0]))
+
+    def _key_path(self, cell):
+        key_path = ()
+        for metric, index in zip(self.fixed_metrics, numpy.unravel_index(cell, self.shape)):
+            key_path += (metric.name, self.bin_labels[metric.name][index])
+        return key_path + (self.free_metric.name,)
+
+    def _cell_individuals(self, cell):
+        return [self.individuals[slot] for slot in self.slots[cell] if slot != self.EMPTY]
+
+    def _occupied_cells(self):
+        return numpy.flatnonzero(self.slots[:, 0] != self.EMPTY)
+
+    def serialize(self, basedir):
+        """
+
+        :param basedir:
+        :return:
+        """
+        population = []
+        for cell in self._occupied_cells():
+            population.extend(self._cell_individuals(cell))
+        return population
+
+    def get_non_empty_bins(self):
+        """
+
+        :return:
+        """
+        return {self._key_path(cell): self._cell_individuals(cell) for cell in self._occupied_cells()}
+
+    def get_points(self):
+        """
+
+        :return:
+        """
+        best = self._to_cost(self.scores[:, 0])
+        occupied = self.slots[:, 0] != self.EMPTY
+
+        if not self.fixed_metrics:
+            return [(self.free_metric.name, float(best[0]) if occupied[0] else None)]
+
+        labels = numpy.array(self.bin_labels[self.fixed_metrics[-1].name], dtype=object)
+        labels = labels[numpy.indices(self.shape)[-1].ravel()]
+        return [(label, float(value) if is_occupied else None)
+                for label, value, is_occupied in zip(labels, best, occupied)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,97 @@
+"""
+Date  : 10/18/26
+
+Brief : Buffered writer and streaming reader of the history of individuals accepted into the archive
+
+Notes : One JSON object per line holding the trial count at the time the individual was accepted, its uuid and its
+        metrics. Lines are kept in memory and appended to the file once flush_size of them are waiting,
+        flush_interval seconds have passed since the last write or the writer is closed.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import ast
+import atexit
+import json
+import time
+
+
+class HistoryLog(object):
+    """
+
+    >>> import tempfile
+    >>> import os
+    >>> path = os.path.join(tempfile.mkdtemp(), 'history.log')
+    >>> history = HistoryLog(path, flush_size=10)
+    >>> history.write(4, [{'uuid': 'a', 'metrics': {'banana': 1.0, 'sinc': 0.5}}])
+    >>> os.path.exists(path)
+    False
+    >>> history.close()
+    >>> list(read_history(path))
+    [{'trial': 4, 'uuid': 'a', 'metrics': {'banana': 1.0, 'sinc': 0.5}}]
+    """
+
+    def __init__(self, path, flush_size=256, flush_interval=5.0):
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.time()
+        atexit.register(self.flush)
+
+    def write(self, trial_count, individuals):
+        """
+
+        :param trial_count: trials run when the individuals were accepted
+        :param individuals: individuals accepted into the archive
+        :return:
+        """
+        for individual in individuals:
+            self.buffer.append(json.dumps({'trial': trial_count,
+                                           'uuid': individual.get('uuid'),
+                                           'metrics': individual.get('metrics')}))
+        if len(self.buffer) >= self.flush_size or time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            with open(self.path, 'a') as f:
+                f.write('\n'.join(self.buffer) + '\n')
+            self.buffer = []
+        self.last_flush = time.time()
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+
+def read_history(path):
+    """
+    Stream the records of a history log, lines written in the older "trial: {metrics}" format are read too
+
+    :param path: history log file
+    :return: generator of {'trial': int, 'uuid': str or None, 'metrics': dict}
+
+    >>> import tempfile
+    >>> import os
+    >>> path = os.path.join(tempfile.mkdtemp(), 'history.log')
+    >>> with open(path, 'w') as f:
+    ...     _ = f.write("12: {'banana': 3.5, 'sinc': 0.25}\\n")
+    >>> list(read_history(path))
+    [{'trial': 12, 'uuid': None, 'metrics': {'banana': 3.5, 'sinc': 0.25}}]
+    """
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                yield json.loads(line)
+            else:
+                trial, metrics = line.split(':', 1)
+                yield {'trial': int(trial), 'uuid': None, 'metrics': ast.literal_eval(metrics.strip())}
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -1,3 +1,6 @@
+import numpy
+
+
 class Metric(object):
 
     def __init__(self, name, fixed_axis, axis_range, partitions, index):
@@ -7,6 +10,27 @@ class Metric(object):
         self.partitions = partitions
         self.index = index
 
+    def bin_edges(self):
+        """
+        Left edge of every bin along this axis, rounded the same way as the archive bin labels
+
+        >>> Metric(name='banana', fixed_axis=True, axis_range=[0, 400], partitions=4, index=0).bin_edges().tolist()
+        [0.0, 100.0, 200.0, 300.0]
+        """
+        # We need N bins so we create N+1 evenly spaced fenceposts with numpy.linspace
+        # Only need left endpoint of each bin, so throwaway the last one
+        _range = self.axis_range
+        return numpy.round(numpy.linspace(min(_range), max(_range), num=self.partitions + 1)[:-1], 2)
+
+    def bin_labels(self):
+        """
+        The bin edges as the string keys used by the archive dictionary
+
+        >>> Metric(name='sinc', fixed_axis=True, axis_range=[0, 1], partitions=3, index=0).bin_labels()
+        ['0.0', '0.33', '0.67']
+        """
+        return [str(float(edge)) for edge in self.bin_edges()]
+
 
 class Metrics(object):
 
@@ -0,0 +1,91 @@
+"""
+Date  : 10/18/26
+
+Brief : Non-dominated sorting of objective vectors
+
+Notes : Every objective is a cost, lower is better. A point is dropped when another point is at least as good in every
+        objective, so of several identical points only the first is kept. Two objectives use a sweep over the points
+        sorted by the first objective, more objectives use Kung's divide and conquer, both O(n log n) to
+        O(n log^(m-2) n) instead of comparing every pair.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import numpy
+
+# below this many points Kung's recursion stops and compares every pair in one vectorized step
+KUNG_BLOCK_SIZE = 32
+
+
+def non_dominated(costs):
+    """
+    Indices of the points no other point dominates
+
+    :param costs: (points, objectives) array, lower is better
+    :return: sorted array of indices into costs
+
+    >>> non_dominated(numpy.array([[1, 5], [2, 2], [3, 3], [5, 1], [2, 2]])).tolist()
+    [0, 1, 3]
+    >>> non_dominated(numpy.array([[1, 5, 1], [2, 2, 2], [3, 3, 3], [5, 1, 0]])).tolist()
+    [0, 1, 3]
+    """
+    costs = numpy.asarray(costs, dtype=float)
+    if len(costs) == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    if costs.shape[1] == 1:
+        return numpy.array([numpy.argmin(costs[:, 0])])
+
+    # lexicographic order, stable so the first of identical points stays ahead of the others
+    order = numpy.lexsort(costs.T[::-1])
+    if costs.shape[1] == 2:
+        kept = order[_sweep(costs[order])]
+    else:
+        kept = order[_kung(costs[order])]
+    return numpy.sort(kept)
+
+
+def _sweep(costs):
+    # sorted by the first objective, a point survives when its second objective beats everything before it
+    second = costs[:, 1]
+    best_before = numpy.minimum.accumulate(second)
+    keep = numpy.ones(len(costs), dtype=bool)
+    keep[1:] = second[1:] < best_before[:-1]
+    return numpy.flatnonzero(keep)
+
+
+def _kung(costs):
+    # costs are sorted lexicographically so nothing in the bottom half can dominate the top half
+    if len(costs) <= KUNG_BLOCK_SIZE:
+        return _pairwise(costs)
+    middle = len(costs) // 2
+    top = _kung(costs[:middle])
+    bottom = _kung(costs[middle:]) + middle
+    dominated = dominated_by(costs[top], costs[bottom])
+    return numpy.concatenate([top, bottom[~dominated]])
+
+
+def _pairwise(costs):
+    # sorted lexicographically a point can only be dominated by points before it
+    at_least_as_good = (costs[None, :, :] <= costs[:, None, :]).all(axis=2)
+    return numpy.flatnonzero(~numpy.tril(at_least_as_good, -1).any(axis=1))
+
+
+def dominated_by(front, candidates):
+    """
+    Vectorized check of every candidate against every point of a front
+
+    :param front: (points, objectives) array
+    :param candidates: (candidates, objectives) array
+    :return: boolean array, True for the candidates some point of the front is at least as good as in every objective
+
+    >>> dominated_by(numpy.array([[1, 1]]), numpy.array([[2, 2], [1, 1], [0, 3]])).tolist()
+    [True, True, False]
+    """
+    if len(front) == 0:
+        return numpy.zeros(len(candidates), dtype=bool)
+    return (front[None, :, :] <= candidates[:, None, :]).all(axis=2).any(axis=1)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,144 @@
+"""
+Date  : 10/18/26
+
+Brief : DataDict whose bins hold the non-dominated set over every free metric instead of the best of one
+
+Notes : The objectives are all metrics with fixed_axis: False, the first of them names the bins as in DataDict. Each
+        bin is kept sorted by the first objective, best first, and is cut to amount_per_bin by that order when the
+        non-dominated set grows larger.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import collections
+
+import numpy
+
+from toga.optimization_state.datadict import DataDict
+from toga.optimization_state.non_dominated import dominated_by, non_dominated
+
+
+class ParetoDataDict(DataDict):
+    """
+
+    >>> from toga.optimization_state.metrics import Metrics
+    >>> settings = {'banana': {'fixed_axis': True, 'range': [0, 400], 'partitions': 40, 'index': 0},
+    ...             'sinc': {'fixed_axis': False, 'range': [-0.5, 0.5], 'partitions': 10, 'index': 1},
+    ...             'foo': {'fixed_axis': False, 'range': [0, 1], 'partitions': 10, 'index': 2}
+    ...             }
+    >>> datadict = ParetoDataDict(fitness_metrics=Metrics(input_dictionary=settings).metrics, amount_per_bin=10)
+    >>> _, updated = datadict.update_from_population([
+    ...     {'uuid': 'a', 'metrics': {'banana': 12.0, 'sinc': 0.3, 'foo': 0.1}},
+    ...     {'uuid': 'b', 'metrics': {'banana': 15.0, 'sinc': 0.1, 'foo': 0.9}},
+    ...     {'uuid': 'c', 'metrics': {'banana': 19.0, 'sinc': 0.2, 'foo': 0.05}}])
+    >>> [individual['uuid'] for individual in datadict.get_dictionary()['banana']['10.0']['sinc']]
+    ['a', 'b']
+    >>> _ = datadict.update_from_population([{'uuid': 'd', 'metrics': {'banana': 11.0, 'sinc': 0.4, 'foo': 1.0}}])
+    >>> [individual['uuid'] for individual in datadict.get_dictionary()['banana']['10.0']['sinc']]
+    ['d']
+    """
+
+    def __init__(self, fitness_metrics=[], maximize=True, amount_per_bin=1, history_log=""):
+        super().__init__(fitness_metrics=fitness_metrics,
+                         maximize=maximize,
+                         amount_per_bin=amount_per_bin,
+                         history_log=history_log)
+        self.objectives = [metric.name for metric in self.fitness_metrics if not metric.fixed_axis]
+
+    def _costs(self, individuals):
+        costs = numpy.array([[individual['metrics'][name] for name in self.objectives] for individual in individuals],
+                            dtype=float).reshape(len(individuals), len(self.objectives))
+        return -costs if self.maximize else costs
+
+    def _merge(self, items, candidates):
+        """
+        Replace the contents of a bin with the non-dominated set of its members and the candidates
+
+        :param items: the bin, sorted best first by the first objective
+        :param candidates: individuals for this bin that aren't stored yet
+        :return: the candidates that were kept
+        """
+        costs = self._costs(candidates)
+        if items:
+            item_costs = self._costs(items)
+            # the bin is already non-dominated, most candidates are rejected here without sorting anything
+            remaining = numpy.flatnonzero(~dominated_by(item_costs, costs))
+            candidates, costs = [candidates[index] for index in remaining], costs[remaining]
+        if not candidates:
+            return []
+
+        front = non_dominated(costs)
+        candidates, costs = [candidates[index] for index in front], costs[front]
+        if items:
+            survivors = ~dominated_by(costs, item_costs)
+            members = [item for item, survives in zip(items, survivors) if survives]
+            member_costs = numpy.concatenate([item_costs[survivors], costs])
+        else:
+            members, member_costs = [], costs
+        first_candidate = len(members)
+        members += candidates
+
+        # stable sort by the first objective, existing members stay ahead of candidates they tie with
+        order = numpy.argsort(member_costs[:, 0], kind='stable')[:self.amount_per_bin]
+        kept = [members[index] for index in order if index >= first_candidate]
+        members = [members[index] for index in order]
+
+        for individual in items:
+            self.uuids.discard(individual.get('uuid'))
+        for individual in members:
+            self.uuids.add(individual.get('uuid'))
+        items[:] = members
+        return kept
+
+    def insert_bounded(self, items, value, key):
+        """
+        Insert into a non-dominated bin. The candidate is checked against the whole bin at once and removes the members
+        it dominates.
+
+        :param items: the bin, sorted best first by the first objective
+        :param value: the individual to insert
+        :param key: unused, the bins are ordered by the first objective
+        :return: True if value was stored in the bin
+        """
+        individual_uuid = value.get('uuid')
+        if individual_uuid is not None and individual_uuid in self.uuids:
+            return False
+        return len(self._merge(items, [value])) > 0
+
+    def update_from_population(self, population=[]):
+        """
+        Candidates are grouped by bin and every bin is merged with one non-dominated sort
+
+        :param population:
+        :return:
+        """
+        population = [individual for individual in population if self.has_metrics(individual)]
+
+        candidates = collections.OrderedDict()
+        seen = set()
+        for individual, key_path in zip(population, self.get_corresponding_bins(population)):
+            individual_uuid = individual.get('uuid')
+            if individual_uuid is not None and (individual_uuid in self.uuids or individual_uuid in seen):
+                continue
+            seen.add(individual_uuid)
+            candidates.setdefault(tuple(key_path), []).append(individual)
+
+        updated_individuals = []
+        for key_path, individuals in candidates.items():
+            items = self._bin(key_path)
+            if items is None:
+                continue
+            kept = self._merge(items, individuals)
+            if kept:
+                self._mark_occupied(key_path, items)
+                self._record_change(key_path)
+                updated_individuals.extend(kept)
+
+        self._log_history(updated_individuals)
+
+        return self.dictionary, updated_individuals
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
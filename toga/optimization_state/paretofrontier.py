@@ -11,48 +11,147 @@ Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
 U.S. Government Sponsorship acknowledged.
 """
 
+import functools
 import glob
 import os
 import pprint
 import shutil
 
+from toga.optimization_state.best_directory import BestDirectory
+from toga.optimization_state.cvt_archive import CVTArchive
 from toga.optimization_state.frontier_plots import Plot
 from toga.optimization_state.datadict import DataDict
+from toga.optimization_state.gridarchive import GridArchive
+from toga.optimization_state.pareto_datadict import ParetoDataDict
+from toga.optimization_state.sparse_datadict import SparseDataDict
+from toga.optimization_state.trial_log import TrialLog
+
+# archive backends selectable with the archive key in gene_performance_metrics.yml
+ARCHIVES = {'datadict': DataDict,
+            'sparse': SparseDataDict,
+            'pareto': ParetoDataDict,
+            'grid': GridArchive,
+            'cvt': CVTArchive}
 
 
 class ParetoFrontier(object):
 
-    def __init__(self, experiment_dir, maximize, fitness_metrics, amount_per_bin, history_log):
+    def __init__(self, experiment_dir, maximize, fitness_metrics, amount_per_bin, history_log=None,
+                 archive='datadict', archive_options=None):
         self.experiment_dir = experiment_dir
         self.maximize = maximize
         self.fitness_metrics = fitness_metrics
         self.amount_per_bin = amount_per_bin
-        self.datadict = DataDict(fitness_metrics=self.fitness_metrics,
-                                 maximize=self.maximize,
-                                 amount_per_bin=self.amount_per_bin,
-                                 history_log=history_log)
+
+        if archive not in ARCHIVES:
+            raise Exception("Unknown archive {}, expected one of {}".format(archive, list(ARCHIVES.keys())))
+        archive_options = dict(archive_options or {})
+        if archive == 'cvt':
+            archive_options.setdefault('cache_dir', os.path.join(self.experiment_dir, 'cvt'))
+        self.datadict = ARCHIVES[archive](fitness_metrics=self.fitness_metrics,
+                                          maximize=self.maximize,
+                                          amount_per_bin=self.amount_per_bin,
+                                          history_log=history_log,
+                                          **archive_options)
+
+        self.best_directory = BestDirectory(os.path.join(self.experiment_dir, 'best'))
+
+        # only the server keeps a write-ahead log, see enable_trial_log
+        self.trial_log = None
 
         self._plot = Plot(self.fitness_metrics,
                           self.maximize,
                           os.path.join(self.experiment_dir, 'graph'))
 
-    def evaluate_fitness(self, population: list):
+    def evaluate_fitness(self, population: list, trials=0):
+        if trials:
+            self.datadict.add_trials(trials)
         reference_dict, new_additions = self.datadict.update_from_population(population)
+        if self.trial_log is not None:
+            self.trial_log.append(trials, new_additions)
         return new_additions
 
+    def enable_trial_log(self, sync_interval=1.0, sync_size=64):
+        self.trial_log = TrialLog(os.path.join(self.experiment_dir, 'trial_log'), sync_interval, sync_size)
+
     def update_from_local_datadict(self, datadict):
         self.datadict.update_from_datadict(datadict)
 
+    def changes_since(self, version, archive_id=None):
+        return self.datadict.get_changes_since(version, archive_id)
+
+    def apply_changes(self, changes):
+        self.datadict.apply_changes(changes)
+
     def update_from_previous_run(self):
         best = os.path.join(self.experiment_dir, "best")
         files = glob.glob(os.path.join(best, "*.yml"))
         if files:
             self.datadict.update_from_previous_run(files)
 
+    def recover(self):
+        """
+        Restore the archive from the trial log checkpoint and the records logged after it, falls back to the best
+        directory when there is no trial log
+
+        :return:
+        """
+        if self.trial_log is None or not self.trial_log.exists():
+            self.update_from_previous_run()
+            return
+
+        trial_count, population, records = self.trial_log.recover()
+
+        # everything being replayed was already written to the history log before the restart
+        track_history = self.datadict.track_history
+        self.datadict.track_history = False
+        try:
+            self.datadict.update_from_population(population)
+            for record in records:
+                self.datadict.update_from_population(record['individuals'])
+                trial_count += record['trials']
+        finally:
+            self.datadict.track_history = track_history
+        self.datadict.add_trials(trial_count)
+
+    def sync(self):
+        """
+        Write out the trial log and history log records still held in memory
+
+        :return:
+        """
+        if self.trial_log is not None:
+            self.trial_log.sync()
+        self.datadict.flush_history()
+
+    def close(self):
+        if self.trial_log is not None:
+            self.trial_log.close()
+        self.datadict.close_history()
+
+    def checkpoint(self):
+        write_checkpoint = self.prepare_checkpoint()
+        if write_checkpoint is not None:
+            write_checkpoint()
+
+    def prepare_checkpoint(self, population=None):
+        """
+        Set the trial log aside and read what the checkpoint needs from the archive, on the thread that updates it
+
+        :param population: the archive population if it was already serialized
+        :return: function writing the checkpoint that can run in an executor, None without a trial log
+        """
+        if self.trial_log is None:
+            return None
+        if population is None:
+            population = self.datadict.serialize(self.experiment_dir)
+        sequence = self.trial_log.rotate()
+        return functools.partial(self.trial_log.write_checkpoint, sequence, self.datadict.trial_count, population)
+
     def serialize(self):
         best = os.path.join(self.experiment_dir, "best")
-        self.clear_previous(best)
         population = self.datadict.serialize(best)
+        self.best_directory.flush(population)
         return population
 
     @staticmethod
@@ -63,6 +162,12 @@ class ParetoFrontier(object):
     def current_frontier(self):
         return self.datadict.get_non_empty_bins()
 
+    def statistics(self, bins=False):
+        return self.datadict.get_statistics(bins)
+
+    def random_elites(self, amount, rng=None):
+        return self.datadict.random_elites(amount, rng)
+
     def print_bests(self):
         pprint.PrettyPrinter().pprint(self.datadict.get_points())
 
@@ -0,0 +1,74 @@
+"""
+Date  : 10/18/26
+
+Brief : DataDict that only creates the bins individuals have been stored in
+
+Notes : With several fixed axes the full grid of empty bins is mostly empty lists, which is slow to build and is sent
+        to every client asking for the state. Here the dictionary starts empty and the path to a bin is added the
+        first time an individual is stored in it. bin_key_paths still enumerates every bin for plotting.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+from toga.optimization_state.datadict import DataDict
+
+
+class SparseDataDict(DataDict):
+    """
+
+    >>> from toga.optimization_state.metrics import Metrics
+    >>> settings = {'banana': {'fixed_axis': True, 'range': [0, 400], 'partitions': 40, 'index': 0},
+    ...             'sinc': {'fixed_axis': False, 'range': [-0.5, 0.5], 'partitions': 10, 'index': 1}
+    ...             }
+    >>> datadict = SparseDataDict(fitness_metrics=Metrics(input_dictionary=settings).metrics, amount_per_bin=2)
+    >>> datadict.get_dictionary()
+    {}
+    >>> _ = datadict.update_from_population([{'uuid': 'a', 'metrics': {'banana': 12.0, 'sinc': 0.3}}])
+    >>> datadict.get_dictionary()
+    {'banana': {'10.0': {'sinc': [{'uuid': 'a', 'metrics': {'banana': 12.0, 'sinc': 0.3}}]}}}
+    >>> points = datadict.get_points()
+    >>> len(points), points[:3]
+    (40, [('0.0', None), ('10.0', 0.3), ('20.0', None)])
+    """
+
+    def __init__(self, fitness_metrics=[], maximize=True, amount_per_bin=1, history_log=""):
+        super().__init__(fitness_metrics=fitness_metrics,
+                         maximize=maximize,
+                         amount_per_bin=amount_per_bin,
+                         history_log=history_log)
+
+    def create_initial(self):
+        if not self.fitness_metrics:
+            raise Exception("No metrics exist\nName metrics inside the Metrics: fitness: section in the run_config yml")
+        return {}
+
+    def _bin(self, key_path):
+        # bins that don't exist yet start out as a detached list, _mark_occupied adds it once something is stored
+        items = self._occupied.get(key_path)
+        return items if items is not None else []
+
+    def _mark_occupied(self, key_path, items):
+        if key_path not in self._occupied:
+            _sub = self.dictionary
+            for key in key_path[:-1]:
+                _sub = _sub.setdefault(key, {})
+            _sub[key_path[-1]] = items
+        super()._mark_occupied(key_path, items)
+
+    def get_points(self):
+        """
+        Best value of every bin of the grid, None for the bins that were never created
+
+        :return:
+        """
+        points = []
+        for key_path in self.bin_key_paths():
+            items = self._occupied.get(key_path)
+            best = self._get_best_metric(items) if items else None
+            points.append((key_path[-2] if len(key_path) > 1 else key_path[-1], best))
+        return points
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,200 @@
+"""
+Date  : 10/18/26
+
+Brief : Write-ahead log of the individuals accepted into the archive and checkpoints of the archive
+
+Notes : Every accepted submission is appended to trials.log as one JSON line with a sequence number. Lines are flushed
+        to disk in batches, when sync_size records are waiting or sync_interval seconds have passed. A checkpoint
+        pickles the trial count and the whole archive population with the sequence number of the last record it
+        includes. The log is set aside as trials.log.previous when the checkpoint is taken, so appends go on in a
+        fresh log while the checkpoint is written, possibly on another thread, and the previous log is deleted once
+        the checkpoint is in place. Recovery loads the checkpoint and replays the records of both logs after it, so a
+        crash only loses the records that had not been synced.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import json
+import logging
+import os
+import pickle
+import time
+
+
+class TrialLog(object):
+    """
+
+    >>> import tempfile
+    >>> import shutil
+    >>> temp_dir = tempfile.mkdtemp()
+    >>> log = TrialLog(temp_dir, sync_size=2)
+    >>> log.append(5, [{'uuid': 'a', 'metrics': {'banana': 1.0}}])
+    >>> log.append(3, [])
+    >>> log.checkpoint(8, [{'uuid': 'a', 'metrics': {'banana': 1.0}}])
+    >>> log.append(2, [{'uuid': 'b', 'metrics': {'banana': 2.0}}])
+    >>> log.close()
+    >>> trial_count, population, records = TrialLog(temp_dir).recover()
+    >>> trial_count, [individual['uuid'] for individual in population]
+    (8, ['a'])
+    >>> [(record['trials'], [individual['uuid'] for individual in record['individuals']]) for record in records]
+    [(2, ['b'])]
+
+    Records appended while a checkpoint is being written are kept, and so is the previous log if writing it fails
+
+    >>> log = TrialLog(temp_dir)
+    >>> _, _, _ = log.recover()
+    >>> sequence = log.rotate()
+    >>> log.append(1, [{'uuid': 'c', 'metrics': {'banana': 3.0}}])
+    >>> log.close()
+    >>> [record['sequence'] for record in TrialLog(temp_dir).recover()[2]]
+    [3, 4]
+    >>> log.write_checkpoint(sequence, 10, [{'uuid': 'a', 'metrics': {'banana': 1.0}}])
+    >>> [record['sequence'] for record in TrialLog(temp_dir).recover()[2]]
+    [4]
+    >>> shutil.rmtree(temp_dir)
+    """
+
+    LOG = 'trials.log'
+    PREVIOUS_LOG = 'trials.log.previous'
+    CHECKPOINT = 'checkpoint.pickle'
+
+    def __init__(self, directory, sync_interval=1.0, sync_size=64):
+        self.directory = directory
+        self.log_path = os.path.join(directory, self.LOG)
+        self.previous_log_path = os.path.join(directory, self.PREVIOUS_LOG)
+        self.checkpoint_path = os.path.join(directory, self.CHECKPOINT)
+        self.sync_interval = sync_interval
+        self.sync_size = sync_size
+
+        self.sequence = 0
+        self.pending = 0
+        self.last_sync = time.time()
+        self._file = None
+
+    def exists(self):
+        return any(os.path.exists(path) for path in (self.checkpoint_path, self.log_path, self.previous_log_path))
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = open(self.log_path, 'a')
+        return self._file
+
+    def append(self, trials, individuals):
+        """
+        Log an accepted submission
+
+        :param trials: trials run to produce the submission
+        :param individuals: the individuals that were stored in the archive
+        :return:
+        """
+        if not trials and not individuals:
+            return
+        self.sequence += 1
+        record = {'sequence': self.sequence, 'trials': trials, 'individuals': individuals}
+        self._open().write(json.dumps(record) + '\n')
+        self.pending += 1
+        if self.pending >= self.sync_size or time.time() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """
+        Force the appended records to disk
+
+        :return:
+        """
+        if self._file is not None and self.pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self.pending = 0
+        self.last_sync = time.time()
+
+    def checkpoint(self, trial_count, population):
+        """
+        Atomically replace the checkpoint with the current archive and start an empty log
+
+        :param trial_count: trials run so far
+        :param population: every individual in the archive
+        :return:
+        """
+        self.write_checkpoint(self.rotate(), trial_count, population)
+
+    def rotate(self):
+        """
+        Sync the log and set it aside for a checkpoint, later records go to a new log. If the previous log is still
+        there because writing the last checkpoint failed, the log is kept as it is.
+
+        :return: sequence number of the last record the checkpoint has to include
+        """
+        self.sync()
+        if not os.path.exists(self.previous_log_path) and os.path.exists(self.log_path):
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(self.log_path, self.previous_log_path)
+        return self.sequence
+
+    def write_checkpoint(self, sequence, trial_count, population):
+        """
+        Atomically replace the checkpoint and delete the log set aside by rotate. Only touches files, so it can run
+        in an executor while records are appended.
+
+        :param sequence: returned by rotate
+        :param trial_count: trials run up to sequence
+        :param population: every individual in the archive up to sequence, not modified while this runs
+        :return:
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self.checkpoint_path + '.tmp'
+        with open(temporary, 'wb') as f:
+            pickle.dump({'sequence': sequence, 'trial_count': trial_count, 'population': population}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.checkpoint_path)
+
+        # records up to sequence are in the checkpoint, if we crash before deleting they are skipped on replay
+        if os.path.exists(self.previous_log_path):
+            os.remove(self.previous_log_path)
+
+    def recover(self):
+        """
+        Read the checkpoint and the log records written after it
+
+        :return: (trial_count, population, records)
+        """
+        trial_count, population, sequence = 0, [], 0
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'rb') as f:
+                checkpoint = pickle.load(f)
+            trial_count, population, sequence = checkpoint['trial_count'], checkpoint['population'], \
+                checkpoint['sequence']
+
+        records = []
+        for path in (self.previous_log_path, self.log_path):
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # a partially written last line from a crash
+                        logging.warning(f'Skipping unreadable record in {path}')
+                        continue
+                    if record['sequence'] > sequence:
+                        records.append(record)
+
+        self.sequence = max([sequence] + [record['sequence'] for record in records])
+        return trial_count, population, records
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -3,49 +3,81 @@ import json
 import aiohttp
 
 
-async def static_ws(url: str, message=None) -> aiohttp.ClientResponse:
+def create_session(limit_per_host=8, keepalive_timeout=60, dns_cache_ttl=300, timeout=60) -> aiohttp.ClientSession:
+    """
+    One session to reuse for every request to the server, so connections are kept alive and pooled instead of being
+    opened for every call. Must be called with the event loop running and closed with await session.close().
+
+    :param limit_per_host: most connections open to the server at once
+    :param keepalive_timeout: seconds an idle connection is kept open
+    :param dns_cache_ttl: seconds a resolved host name is cached
+    :param timeout: seconds a request may take in total
+    :return:
+    """
+    connector = aiohttp.TCPConnector(limit_per_host=limit_per_host,
+                                     keepalive_timeout=keepalive_timeout,
+                                     ttl_dns_cache=dns_cache_ttl,
+                                     use_dns_cache=True)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout))
+
+
+async def static_ws(url: str, message=None, session=None) -> aiohttp.ClientResponse:
     if message is None:
         message = {}
-    async with aiohttp.ClientSession() as session:
-        async with session.ws_connect(url + "/ws") as ws:
-            await ws.send_json(json.dumps(message))
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await static_ws(url, message, session)
+    async with session.ws_connect(url + "/ws") as ws:
+        await ws.send_json(json.dumps(message))
 
 
-async def static_post(url: str, name: str, uuid: str, remove=False) -> aiohttp.ClientResponse:
+async def static_post(url: str, name: str, uuid: str, remove=False, session=None) -> aiohttp.ClientResponse:
     _dict = {'worker': name, "uuid": uuid, "remove": remove}
     data = json.dumps(_dict)
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url + "/available", data=data) as resp:
-            return await resp.json()
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await static_post(url, name, uuid, remove, session)
+    async with session.post(url + "/available", data=data) as resp:
+        return await resp.json()
 
 
-async def request_task(url) -> None:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url + "/request") as resp:
-            return await resp.json()
+async def request_task(url, session=None) -> None:
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await request_task(url, session)
+    async with session.get(url + "/request") as resp:
+        return await resp.json()
 
 
-async def available(url='', name='', uuid="parent", remove=False) -> aiohttp.ClientResponse:
+async def available(url='', name='', uuid="parent", remove=False, session=None) -> aiohttp.ClientResponse:
     _dict = {'worker': name, "uuid": uuid, "remove": remove}
     data = json.dumps(_dict)
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url + "/available", data=data) as resp:
-            return await resp.json()
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await available(url, name, uuid, remove, session)
+    async with session.post(url + "/available", data=data) as resp:
+        return await resp.json()
 
 
-async def submit_results(url='', local_state={}) -> aiohttp.ClientResponse:
-    async with aiohttp.ClientSession() as session:
-        async with session.put(url + "/submit", data=json.dumps(local_state)) as resp:
-            return await resp.json()
+async def submit_results(url='', local_state={}, session=None) -> aiohttp.ClientResponse:
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await submit_results(url, local_state, session)
+    async with session.put(url + "/submit", data=json.dumps(local_state)) as resp:
+        return await resp.json(content_type=None)
 
 
-async def request_state(url='') -> aiohttp.ClientResponse:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url + "/best", data=None) as resp:
-            return await resp.json()
+async def request_state(url='', session=None) -> aiohttp.ClientResponse:
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await request_state(url, session)
+    async with session.get(url + "/best", data=None) as resp:
+        return await resp.json()
 
 
-async def ws(url, message="") -> None:
-    async with aiohttp.ClientSession() as session:
-        async with session.ws_connect(url + "/ws") as ws:
-            await ws.send_str(message)
+async def ws(url, message="", session=None) -> None:
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await ws(url, message, session)
+    async with session.ws_connect(url + "/ws") as socket:
+        await socket.send_str(message)
@@ -1,12 +1,15 @@
 import asyncio
+import collections
 import json
+import logging
 import os
 import shutil
 
 import yaml
-from aiohttp import web
+from aiohttp import WSMsgType, web
 from aiojobs.aiohttp import get_scheduler
 
+from toga import wire_format
 from toga.toga_settings import Settings
 
 
@@ -20,29 +23,146 @@ class FrontierState(object):
         self.workers = {}
         self.generation_number = 0
 
+        # how long each of the recent snapshots of the best directory took
+        self.snapshot_timings = collections.deque(maxlen=100)
+
+        # clients connected to /ws and the archive version each was last sent
+        self.subscribers = {}
+
     async def submit_individual(self, request: web.Request) -> web.json_response():
         """
 
         :param request:
         :return:
         """
-        individual = await request.json()
+        individual = await wire_format.read_request(request)
+        content_type = wire_format.negotiate(request.headers.get('Accept'))
         if individual is not None:
-            count = individual.get('trials')
-            self.pareto_frontier.datadict.add_trials(count)
-            self.pareto_frontier.evaluate_fitness([individual])
+            self.pareto_frontier.evaluate_fitness([individual], individual.get('trials') or 0)
             uuid = individual.get('uuid')
             response = {'individual': uuid, 'status': 'successfully stored'}
-            return web.json_response(json.dumps(response))
+            if content_type is None:
+                return web.json_response(json.dumps(response))
+            return wire_format.response(request, response, content_type)
         response = {'Malformed sample was sent, not storing'}
         return web.json_response(json.dumps(response))
 
+    async def submit_batch(self, request: web.Request) -> web.json_response():
+        """
+        Store a list of individuals with one archive update. The body is {'individuals': [...]} where every individual
+        carries the amount of trials its client ran since its previous high performer.
+
+        :param request:
+        :return: the uuids that were kept in the archive
+        """
+        batch = await wire_format.read_request(request)
+        individuals = batch.get('individuals') if isinstance(batch, dict) else None
+        if not isinstance(individuals, list) or not all(isinstance(individual, dict) for individual in individuals):
+            return web.json_response({'status': 'Malformed batch was sent, not storing'}, status=400)
+
+        trials = sum(individual.get('trials') or 0 for individual in individuals)
+        stored = self.pareto_frontier.evaluate_fitness(individuals, trials)
+        return wire_format.response(request, {'received': len(individuals),
+                                              'stored': [individual.get('uuid') for individual in stored],
+                                              'status': 'successfully stored'})
+
     async def get_state(self, request):
         """
+        Without query parameters the whole archive is returned. With ?since=<version>&archive=<archive id> only the
+        bins changed after that version are returned along with the new version to ask from next time.
+
+        The response is encoded in the format named in the Accept header. Clients that don't name one get the
+        dictionary as a JSON string inside JSON, as before.
+
+        :return:
+        """
+        content_type = wire_format.negotiate(request.headers.get('Accept'))
+        since = request.query.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return web.json_response({'status': f'since must be an archive version, got {since!r}'}, status=400)
+            changes = self.pareto_frontier.changes_since(since, request.query.get('archive'))
+            return wire_format.response(request, changes, content_type)
+        if content_type is None:
+            return web.json_response(json.dumps(self.pareto_frontier.datadict.get_dictionary()))
+        return wire_format.response(request, self.pareto_frontier.datadict.get_dictionary(), content_type)
+
+    async def websocket(self, request):
+        """
+        Push archive changes to a client as they happen instead of waiting for it to poll /get_state. The client sends
+        {'since': <version>, 'archive': <archive id>} once connected and receives the output of get_changes_since,
+        first to catch up and then whenever push_changes finds new changes. Messages are encoded in the format named
+        in the Accept header of the handshake, msgpack as binary frames and JSON as text frames.
 
+        :param request:
+        :return:
+        """
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        subscriber = {'version': None, 'archive': None,
+                      'content_type': wire_format.negotiate(request.headers.get('Accept')) or wire_format.JSON}
+        self.subscribers[ws] = subscriber
+        try:
+            async for message in ws:
+                if message.type == WSMsgType.TEXT:
+                    subscription = wire_format.decode(message.data.encode('utf-8'), wire_format.JSON)
+                elif message.type == WSMsgType.BINARY:
+                    subscription = wire_format.decode(message.data, subscriber['content_type'])
+                else:
+                    break
+                subscriber['version'] = int(subscription.get('since', 0))
+                subscriber['archive'] = subscription.get('archive')
+                await self.push(ws, subscriber)
+        finally:
+            self.subscribers.pop(ws, None)
+        return ws
+
+    async def push(self, ws, subscriber):
+        changes = self.pareto_frontier.changes_since(subscriber['version'], subscriber['archive'])
+        body = wire_format.encode(changes, subscriber['content_type'])
+        if subscriber['content_type'] == wire_format.JSON:
+            await ws.send_str(body.decode('utf-8'))
+        else:
+            await ws.send_bytes(body)
+        subscriber['version'] = changes['version']
+        subscriber['archive'] = changes['archive']
+
+    async def push_changes(self, interval=0.5):
+        """
+        Send every subscribed client the bins that changed since it was last updated. Changes are gathered for interval
+        seconds so a burst of submissions goes out as one message.
+
+        :param interval: seconds between checks for new changes
+        :return:
+        """
+        while True:
+            await asyncio.sleep(interval)
+            version = self.pareto_frontier.datadict.version
+            archive = self.pareto_frontier.datadict.archive_id
+            for ws, subscriber in list(self.subscribers.items()):
+                if subscriber['version'] is None or ws.closed:
+                    continue
+                if subscriber['version'] == version and subscriber['archive'] == archive:
+                    continue
+                try:
+                    await self.push(ws, subscriber)
+                except Exception as e:
+                    logging.warning(f'Dropping subscriber after failed push: {e}')
+                    self.subscribers.pop(ws, None)
+
+    async def get_stats(self, request):
+        """
+        Coverage, QD-score and best value of the archive along with the timings of the last snapshot of best/. Add
+        ?bins=1 to also get the best and the number of improvements of every occupied bin.
+
+        :param request:
         :return:
         """
-        return web.json_response(json.dumps(self.pareto_frontier.datadict.get_dictionary()))
+        statistics = self.pareto_frontier.statistics(bins=request.query.get('bins') in ('1', 'true', 'True'))
+        statistics['last_snapshot'] = self.snapshot_timings[-1] if self.snapshot_timings else None
+        return wire_format.response(request, statistics)
 
 
 if __name__ == '__main__':
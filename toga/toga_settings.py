@@ -24,6 +24,11 @@ class Settings(metaclass=Singleton):
         self.optimization_strategy = genetic_algorithm_settings['optimization_strategy_maximize']
         self.individual_per_bin = genetic_algorithm_settings['individuals_per_bin']
 
+        # every individual's random stream is derived from the seed, a random one is picked if it's empty
+        self.seed = genetic_algorithm_settings.get('seed')
+        # clients sharing a seed need different streams to create different individuals
+        self.seed_stream = genetic_algorithm_settings.get('seed_stream', 0)
+
         with open(os.path.join(os.path.dirname(__file__), 'config', 'gene_performance_metrics.yml'), 'r') as f:
             gene_performance_metrics = yaml.safe_load(f)
 
@@ -32,6 +37,10 @@ class Settings(metaclass=Singleton):
         # metrics that are used to optimize parameters
         self.optimization_metrics = gene_performance_metrics['fitness']
 
+        # storage backend for the high performers, datadict or grid
+        self.archive = gene_performance_metrics.get('archive', 'datadict')
+        self.archive_options = gene_performance_metrics.get(self.archive) or {}
+
         with open(os.path.join(os.path.dirname(__file__), 'config', 'server_settings.yml'), 'r') as f:
             server_settings = yaml.safe_load(f)
 
@@ -40,6 +49,19 @@ class Settings(metaclass=Singleton):
         # server settings
         self.host = server_settings['host']
         self.port = server_settings['port']
+        self.sync_interval = server_settings.get('sync_interval', 360)
+        self.submit_batch_size = server_settings.get('submit_batch_size', 1)
+        self.submit_batch_age = server_settings.get('submit_batch_age', 0)
+        self.wire_format = server_settings.get('wire_format', 'auto')
+        self.compress_requests = server_settings.get('compress_requests', False)
+        self.trial_log_sync_interval = server_settings.get('trial_log_sync_interval', 1.0)
+        self.trial_log_sync_size = server_settings.get('trial_log_sync_size', 64)
+        self.connection_limit_per_host = server_settings.get('connection_limit_per_host', 8)
+        self.keepalive_timeout = server_settings.get('keepalive_timeout', 60)
+        self.dns_cache_ttl = server_settings.get('dns_cache_ttl', 300)
+        self.request_timeout = server_settings.get('request_timeout', 60)
+        self.push_interval = server_settings.get('push_interval', 0.5)
+        self.use_websocket = server_settings.get('use_websocket', True)
 
         with open(os.path.join(os.path.dirname(__file__), 'config', 'run_settings.yml'), 'r') as f:
             run_settings = yaml.safe_load(f)
@@ -75,6 +97,7 @@ class Settings(metaclass=Singleton):
         self.process_pool_size = run_settings['workers']['max_workers']
         self.timeout = run_settings['workers']['max_run_time']
         self.overfill_executor_limit = run_settings['workers']['over_fill_executor']
+        self.executor = run_settings['workers'].get('executor', 'process_pool')
 
     def create_output_directory(self):
         if not os.path.exists(self.output_dir):
@@ -0,0 +1,138 @@
+"""
+Date  : 10/18/26
+
+Brief : Encoding of the archive and individuals exchanged between the toga server and clients
+
+Notes : JSON is always available. msgpack is used when the msgpack package is installed on both ends, the client
+        asks for it with the Accept header and labels what it sends with Content-Type, so a server or client without
+        msgpack keeps talking JSON. Responses are gzip compressed when the client accepts it.
+
+Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
+U.S. Government Sponsorship acknowledged.
+"""
+import json
+
+from aiohttp import web
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+
+# responses smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 1024
+
+
+def available_formats():
+    """
+
+    :return: the content types this process can encode and decode, most compact first
+    """
+    if msgpack is not None:
+        return [MSGPACK, JSON]
+    return [JSON]
+
+
+def select_format(requested='auto'):
+    """
+    Pick the content type a client should ask for
+
+    :param requested: auto, json or msgpack
+    :return: content type
+
+    >>> select_format('json')
+    'application/json'
+    """
+    if requested == 'json':
+        return JSON
+    if requested == 'msgpack':
+        if msgpack is None:
+            raise Exception("msgpack wire format requested but the msgpack package is not installed")
+        return MSGPACK
+    return available_formats()[0]
+
+
+def negotiate(accept=None):
+    """
+    Choose the response content type from a request's Accept header
+
+    :param accept: the Accept header
+    :return: content type, or None when the client did not ask for a supported format by name. Such clients predate
+             negotiation and expect the original responses.
+
+    >>> negotiate('*/*') is None
+    True
+    >>> negotiate('text/html, application/json')
+    'application/json'
+    """
+    if accept:
+        requested = [item.split(';')[0].strip() for item in accept.split(',')]
+        for content_type in requested:
+            if content_type in available_formats():
+                return content_type
+    return None
+
+
+def encode(data, content_type=JSON) -> bytes:
+    """
+
+    :param data: dictionaries, lists and scalars
+    :param content_type: JSON or MSGPACK
+    :return: the encoded bytes
+
+    >>> decode(encode({'banana': {'0.0': {'sinc': []}}}), JSON)
+    {'banana': {'0.0': {'sinc': []}}}
+    """
+    if content_type == MSGPACK:
+        return msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data).encode('utf-8')
+
+
+def decode(body: bytes, content_type=JSON):
+    """
+
+    :param body: the encoded bytes
+    :param content_type: JSON or MSGPACK
+    :return: the decoded data
+    """
+    if content_type == MSGPACK:
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body)
+
+
+async def read_request(request: web.Request):
+    """
+    Decode a request body according to its Content-Type
+
+    :param request:
+    :return: the decoded data
+    """
+    if request.content_type == MSGPACK and msgpack is not None:
+        return decode(await request.read(), MSGPACK)
+    return await request.json()
+
+
+def response(request: web.Request, data, content_type=None) -> web.Response:
+    """
+    Encode data in the format the request asked for and compress it if the client accepts compression
+
+    :param request:
+    :param data: dictionaries, lists and scalars
+    :param content_type: overrides the negotiated content type
+    :return:
+    """
+    if content_type is None:
+        content_type = negotiate(request.headers.get('Accept')) or JSON
+    body = encode(data, content_type)
+    resp = web.Response(body=body, content_type=content_type)
+    if len(body) >= COMPRESS_MIN_SIZE:
+        resp.enable_compression()
+    return resp
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
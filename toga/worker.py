@@ -11,8 +11,10 @@ Copyright 2019 California Institute of Technology.  ALL RIGHTS RESERVED.
 U.S. Government Sponsorship acknowledged.
 """
 
+import asyncio
 import os
 import platform
+import shlex
 import subprocess
 from shutil import rmtree
 from typing import Tuple, Optional, Any
@@ -49,6 +51,29 @@ def call(*popenargs, timeout=None, **kwargs):
             raise
 
 
+def kill_tree(pid):
+    """
+    Kill a process and every process it started
+
+    :param pid:
+    :return:
+    """
+    try:
+        process = psutil.Process(pid)
+        children = process.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return
+    for child in children:
+        try:
+            child.kill()
+        except psutil.NoSuchProcess:
+            pass
+    try:
+        process.kill()
+    except psutil.NoSuchProcess:
+        pass
+
+
 class Worker(object):
     """
 
@@ -100,6 +125,47 @@ class Worker(object):
             f'{self.settings.gene_arg} {self.serialization_path} {self.settings.static_args}'
         return command
 
+    def make_run_args(self) -> list:
+        """
+        The run command as arguments for exec. Activating a conda environment needs a shell so that case still goes
+        through bash, otherwise the command is started directly.
+
+        :return: list of arguments
+        """
+        if self.settings.use_conda_env:
+            return ['bash', '-c', self.make_run_command()]
+        return shlex.split(f'{self.settings.runnable_cmd} '
+                           f'{self.settings.gene_arg} {self.serialization_path} {self.settings.static_args}')
+
+    async def run_async(self):
+        """
+        Same as run but the command is started with asyncio from the calling event loop instead of blocking a pool
+        process. On timeout or cancellation the command and everything it started are killed.
+
+        :return: self
+        """
+        if not os.path.exists(self.relative_work_dir):
+            os.mkdir(self.relative_work_dir)
+
+        self.serialize_chromosome(
+            active_chromosome=self.gene,
+            outpath=self.serialization_path)
+
+        process = await asyncio.create_subprocess_exec(*self.make_run_args(),
+                                                       stderr=subprocess.STDOUT,
+                                                       cwd=self.relative_work_dir,
+                                                       start_new_session=True)
+        try:
+            await asyncio.wait_for(process.wait(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if process.returncode is None:
+                kill_tree(process.pid)
+                await process.wait()
+
+        return self
+
     def run(self):
         """
 
@@ -134,7 +200,8 @@ class Worker(object):
     def cleanup(self) -> None:
         if os.path.isdir(self.relative_work_dir):
             rmtree(self.relative_work_dir, ignore_errors=True)
-        os.remove(self.serialization_path)
+        if os.path.exists(self.serialization_path):
+            os.remove(self.serialization_path)
 
     def response(self) -> Tuple[Optional[Any], Optional[Any], Any]:
         metrics_path = os.path.join(self.relative_work_dir, self.settings.metrics_out_location)